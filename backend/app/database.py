@@ -1,10 +1,15 @@
+from array import array
 from datetime import datetime, timezone
 import os
 from pathlib import Path
-from typing import Generator
+from typing import AsyncGenerator, Generator
 
-from sqlalchemy import create_engine, text
+import orjson
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase, Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from sqlalchemy.schema import CreateTable
 
 
 _DEFAULT_SQLITE_PATH = Path(__file__).resolve().parent.parent / "app.db"
@@ -17,13 +22,90 @@ class Base(DeclarativeBase):
     """Shared base class for ORM models."""
 
 
-_connect_args = {"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
-_engine = create_engine(
-    DATABASE_URL,
-    echo=os.getenv("SQL_ECHO", "0") == "1",
-    future=True,
-    connect_args=_connect_args,
-)
+def _is_sqlite_memory(url: str) -> bool:
+    return url in {"sqlite://", "sqlite:///:memory:"} or "mode=memory" in url
+
+
+def _async_database_url(url: str) -> str:
+    if url.startswith("sqlite:"):
+        return "sqlite+aiosqlite:" + url[len("sqlite:"):]
+    for prefix in ("postgresql+psycopg2:", "postgresql:", "postgres:"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg:" + url[len(prefix):]
+    return url
+
+
+def _json_serializer(value) -> str:
+    return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+
+
+def _engine_options(*, is_async: bool) -> dict:
+    options: dict = {
+        "echo": os.getenv("SQL_ECHO", "0") == "1",
+        "json_serializer": _json_serializer,
+        "json_deserializer": orjson.loads,
+    }
+    if DATABASE_URL.startswith("sqlite"):
+        options["connect_args"] = {"check_same_thread": False, "timeout": 30}
+    if not _is_sqlite_memory(DATABASE_URL):
+        # In-memory SQLite keeps its per-thread pool: every new connection would be a fresh database.
+        options.update(
+            poolclass=AsyncAdaptedQueuePool if is_async else QueuePool,
+            pool_size=int(os.getenv("DB_POOL_SIZE", "20")),
+            max_overflow=int(os.getenv("DB_POOL_OVERFLOW", "40")),
+            pool_pre_ping=True,
+            pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),
+            # LIFO checkout keeps a small hot set of connections and lets idle extras age out.
+            pool_use_lifo=True,
+            echo_pool=os.getenv("SQL_ECHO_POOL", "0") == "1",
+        )
+    return options
+
+
+_engine = create_engine(DATABASE_URL, future=True, **_engine_options(is_async=False))
+_async_engine = create_async_engine(_async_database_url(DATABASE_URL), **_engine_options(is_async=True))
+
+_SQLITE_CACHE_KB = int(os.getenv("SQLITE_CACHE_KB", "64000"))
+_SQLITE_MMAP_BYTES = int(os.getenv("SQLITE_MMAP_BYTES", "268435456"))
+
+
+def _apply_sqlite_pragmas(dbapi_connection, _connection_record) -> None:
+    # Take transaction control away from the driver: pysqlite only opens a
+    # transaction before DML, so a SAVEPOINT issued first became the outermost
+    # transaction and its RELEASE committed. _begin_sqlite_transaction emits BEGIN.
+    dbapi_connection.isolation_level = None
+    cursor = dbapi_connection.cursor()
+    try:
+        if not _is_sqlite_memory(DATABASE_URL):
+            cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute(f"PRAGMA cache_size=-{_SQLITE_CACHE_KB}")
+        cursor.execute(f"PRAGMA mmap_size={_SQLITE_MMAP_BYTES}")
+        cursor.execute("PRAGMA foreign_keys=ON")
+    finally:
+        cursor.close()
+
+
+def _begin_sqlite_transaction(conn) -> None:
+    conn.exec_driver_sql("BEGIN")
+
+
+def _set_sqlite_foreign_keys(conn, enabled: bool) -> None:
+    # SQLite ignores this pragma inside a transaction and every Connection.execute
+    # now starts with BEGIN, so send it straight to the driver connection.
+    conn.connection.dbapi_connection.execute(f"PRAGMA foreign_keys={'ON' if enabled else 'OFF'}")
+
+
+# These listeners apply to every SQLite connection, sync and async: each
+# Session / Connection transaction starts with an explicit BEGIN, and a
+# rollback undoes everything since that BEGIN (not just the statements after
+# the driver's first implicit one), including SAVEPOINTs nested inside it.
+if _engine.dialect.name == "sqlite":
+    for _sync_engine in (_engine, _async_engine.sync_engine):
+        event.listen(_sync_engine, "connect", _apply_sqlite_pragmas)
+        event.listen(_sync_engine, "begin", _begin_sqlite_transaction)
+
 
 SessionLocal = sessionmaker(
     bind=_engine,
@@ -44,14 +126,52 @@ def get_session() -> Generator[Session, None, None]:
         session.close()
 
 
-def _ensure_table_columns(conn, table: str, definitions: list[tuple[str, str]]) -> set[str] | None:
-    table_exists = conn.execute(text("SELECT name FROM sqlite_master WHERE type='table' AND name=:name"), {"name": table})
-    if not table_exists.first():
-        return None
-    columns = {row[1] for row in conn.execute(text(f"PRAGMA table_info({table})"))}
-    if not columns:
-        return set()
+AsyncSessionLocal = async_sessionmaker(
+    bind=_async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
+
+async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
+    """FastAPI dependency that yields an async DB session for non-blocking handlers."""
+
+    async with AsyncSessionLocal() as session:
+        yield session
+
+
+def _load_schema(conn, tables: tuple[str, ...]) -> tuple[dict[str, set[str]], dict[str, set[str]]]:
+    """Fetch column and index names for the given tables in two round trips."""
 
+    placeholders = ", ".join(f":t{i}" for i in range(len(tables)))
+    params = {f"t{i}": table for i, table in enumerate(tables)}
+    columns: dict[str, set[str]] = {}
+    for table, column in conn.execute(
+        text(
+            "SELECT m.name, p.name FROM sqlite_master AS m JOIN pragma_table_info(m.name) AS p "
+            f"WHERE m.type = 'table' AND m.name IN ({placeholders})"
+        ),
+        params,
+    ):
+        columns.setdefault(table, set()).add(column)
+    indexes: dict[str, set[str]] = {table: set() for table in columns}
+    for table, index in conn.execute(
+        text(
+            "SELECT m.name, p.name FROM sqlite_master AS m JOIN pragma_index_list(m.name) AS p "
+            f"WHERE m.type = 'table' AND m.name IN ({placeholders})"
+        ),
+        params,
+    ):
+        indexes[table].add(index)
+    return columns, indexes
+
+
+def _ensure_table_columns(
+    conn, table: str, columns: set[str] | None, definitions: list[tuple[str, str]]
+) -> set[str] | None:
+    if columns is None:
+        return None
     for name, ddl in definitions:
         if name not in columns:
             conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
@@ -59,83 +179,260 @@ def _ensure_table_columns(conn, table: str, definitions: list[tuple[str, str]])
     return columns
 
 
-def _ensure_table_indexes(conn, table: str, definitions: list[tuple[str, str]]) -> None:
-    indexes = {row[1] for row in conn.execute(text(f"PRAGMA index_list({table})"))}
+def _ensure_table_indexes(conn, indexes: set[str], definitions: list[tuple[str, str]]) -> None:
     for name, ddl in definitions:
         if name not in indexes:
             conn.execute(text(ddl))
 
 
-def _apply_sqlite_migrations() -> None:
+def _backfill_nulls(
+    conn, table: str, definitions: list[tuple[str, str]], params: dict | None = None
+) -> None:
+    # NOT NULL DEFAULT columns are filled by SQLite at ALTER time; only nullable
+    # columns need a backfill, and only the rows that are actually NULL.
+    for name, expression in definitions:
+        conn.execute(text(f"UPDATE {table} SET {name} = {expression} WHERE {name} IS NULL"), params or {})
+
+
+# Tables whose UUID string keys became INTEGER rowid aliases in schema version 3.
+# Tables referencing chat_messages are rebuilt first so they can map old ids.
+_INTEGER_PK_TABLES: dict[str, dict[str, str]] = {
+    "reactions": {
+        "message_id": "(SELECT m.rowid FROM chat_messages AS m WHERE m.id = src.message_id)",
+    },
+    "moderation_logs": {
+        "entity_id": (
+            "CASE WHEN src.entity_type = 'MESSAGE' THEN COALESCE("
+            "(SELECT CAST(m.rowid AS TEXT) FROM chat_messages AS m WHERE m.id = src.entity_id), src.entity_id"
+            ") ELSE src.entity_id END"
+        ),
+    },
+    "chat_messages": {},
+    "queue_entries": {},
+    "room_track_history": {},
+    "recommendation_events": {},
+    "embeddings": {},
+}
+
+
+def _rebuild_with_integer_pk(conn, table, overrides: dict[str, str]) -> None:
+    name = table.name
+    existing = {row[1]: (row[2] or "").upper() for row in conn.execute(text(f"PRAGMA table_info({name})"))}
+    if not existing or existing.get("id") == "INTEGER":
+        return
+
+    staging = f"{name}__rebuild"
+    ddl = str(CreateTable(table).compile(dialect=conn.dialect)).strip()
+    conn.execute(text(ddl.replace(f"CREATE TABLE {name} (", f"CREATE TABLE {staging} (", 1)))
+    columns = [column.name for column in table.columns if column.name in existing]
+    expressions = ["src.rowid" if column == "id" else overrides.get(column, f"src.{column}") for column in columns]
+    conn.execute(text(
+        f"INSERT INTO {staging} ({', '.join(columns)}) "
+        f"SELECT {', '.join(expressions)} FROM {name} AS src ORDER BY src.rowid"
+    ))
+    conn.execute(text(f"DROP TABLE {name}"))
+    conn.execute(text(f"ALTER TABLE {staging} RENAME TO {name}"))
+    for index in table.indexes:
+        index.create(conn, checkfirst=True)
+
+
+def _remap_pinned_message_ids(conn) -> None:
+    # rooms keeps its key but stores message ids in a JSON list; swap each UUID
+    # for the rowid that becomes the message's integer id, dropping pins whose
+    # message is gone. Must run while chat_messages still has its string ids.
+    message_ids = {row[1]: (row[2] or "").upper() for row in conn.execute(text("PRAGMA table_info(chat_messages)"))}
+    room_columns = {row[1] for row in conn.execute(text("PRAGMA table_info(rooms)"))}
+    if message_ids.get("id") in (None, "INTEGER") or "pinned_message_ids" not in room_columns:
+        return
+    conn.execute(text(
+        "UPDATE rooms SET pinned_message_ids = ("
+        "SELECT json_group_array(m.rowid) FROM ("
+        "SELECT p.value AS message_id FROM json_each(rooms.pinned_message_ids) AS p ORDER BY p.key"
+        ") AS pin JOIN chat_messages AS m ON m.id = pin.message_id"
+        ") WHERE json_array_length(pinned_message_ids) > 0"
+    ))
+
+
+def _rebuild_integer_pk_tables() -> None:
+    from . import models
+
+    with _engine.connect() as conn:
+        # Dropping a referenced table is only allowed with enforcement off.
+        _set_sqlite_foreign_keys(conn, False)
+        try:
+            with conn.begin():
+                _remap_pinned_message_ids(conn)
+                for table_name, overrides in _INTEGER_PK_TABLES.items():
+                    _rebuild_with_integer_pk(conn, models.Base.metadata.tables[table_name], overrides)
+        finally:
+            _set_sqlite_foreign_keys(conn, True)
+
+
+# Bump whenever the manual migrations below change so existing databases re-run them.
+CURRENT_SCHEMA_VERSION = 10
+
+
+def _sqlite_schema_state() -> tuple[int | None, bool]:
+    """Return ``(user_version, has_users_table)`` in one round trip; ``(None, False)`` off SQLite."""
+
     if _engine.dialect.name != "sqlite":
+        return None, False
+    with _engine.connect() as conn:
+        version, has_users = conn.execute(text(
+            "SELECT (SELECT user_version FROM pragma_user_version), "
+            "EXISTS (SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users')"
+        )).one()
+        return version or 0, bool(has_users)
+
+
+def _apply_sqlite_migrations(schema_version: int | None) -> None:
+    if schema_version is None:
         return
+    if schema_version < 3:
+        _rebuild_integer_pk_tables()
+
     with _engine.begin() as conn:
-        user_columns = _ensure_table_columns(conn, "users", [
-            ("spotify_id", "TEXT"),
-            ("avatar_url", "TEXT"),
-            ("email", "TEXT"),
-            ("country", "TEXT"),
-            ("product", "TEXT"),
-            ("access_token", "TEXT NOT NULL DEFAULT ''"),
-            ("refresh_token", "TEXT NOT NULL DEFAULT ''"),
-            ("token_expires_at", "TEXT"),
-            ("scope", "TEXT"),
-            ("reputation", "REAL NOT NULL DEFAULT 0.0"),
+        if schema_version < CURRENT_SCHEMA_VERSION:
+            _migrate_sqlite_schema(conn)
+            conn.execute(text(f"PRAGMA user_version = {CURRENT_SCHEMA_VERSION}"))
+
+        has_stats = conn.execute(
+            text("SELECT name FROM sqlite_master WHERE type='table' AND name='sqlite_stat1'")
+        ).first()
+        if not has_stats:
+            conn.execute(text("ANALYZE"))
+        conn.execute(text("PRAGMA optimize"))
+
+
+def _migrate_sqlite_schema(conn) -> None:
+    from . import models
+
+    columns, indexes = _load_schema(conn, ("users", "artists", "tracks", "spotify_auth_state", "embeddings"))
+
+    user_columns = _ensure_table_columns(conn, "users", columns.get("users"), [
+        ("spotify_id", "TEXT"),
+        ("avatar_url", "TEXT"),
+        ("email", "TEXT"),
+        ("country", "TEXT"),
+        ("product", "TEXT"),
+        ("access_token", "TEXT NOT NULL DEFAULT ''"),
+        ("refresh_token", "TEXT NOT NULL DEFAULT ''"),
+        ("token_expires_at", "TEXT"),
+        ("scope", "TEXT"),
+        ("reputation", "REAL NOT NULL DEFAULT 0.0"),
+    ])
+    if user_columns is not None:
+        now_iso = datetime.now(timezone.utc).isoformat()
+        conn.execute(text("UPDATE users SET spotify_id = 'legacy-' || id WHERE spotify_id IS NULL OR spotify_id = ''"))
+        _backfill_nulls(conn, "users", [("token_expires_at", ":now")], {"now": now_iso})
+        _ensure_table_indexes(conn, indexes["users"], [
+            ("ix_users_spotify_id", "CREATE UNIQUE INDEX IF NOT EXISTS ix_users_spotify_id ON users(spotify_id)"),
         ])
-        if user_columns is not None:
-            now_iso = datetime.now(timezone.utc).isoformat()
-            conn.execute(text("UPDATE users SET spotify_id = COALESCE(spotify_id, 'legacy-' || id) WHERE spotify_id IS NULL OR spotify_id = ''"))
-            conn.execute(text("UPDATE users SET access_token = COALESCE(access_token, '')"))
-            conn.execute(text("UPDATE users SET refresh_token = COALESCE(refresh_token, '')"))
-            conn.execute(text("UPDATE users SET token_expires_at = COALESCE(token_expires_at, :now)"), {"now": now_iso})
-            conn.execute(text("UPDATE users SET reputation = COALESCE(reputation, 0.0)"))
-            _ensure_table_indexes(conn, "users", [
-                ("ix_users_spotify_id", "CREATE UNIQUE INDEX IF NOT EXISTS ix_users_spotify_id ON users(spotify_id)"),
-            ])
-
-        artist_columns = _ensure_table_columns(conn, "artists", [
-            ("spotify_id", "TEXT"),
-            ("spotify_uri", "TEXT"),
-            ("spotify_url", "TEXT"),
-            ("followers", "INTEGER NOT NULL DEFAULT 0"),
-            ("popularity", "INTEGER NOT NULL DEFAULT 0"),
+
+    artist_columns = _ensure_table_columns(conn, "artists", columns.get("artists"), [
+        ("spotify_id", "TEXT"),
+        ("spotify_uri", "TEXT"),
+        ("spotify_url", "TEXT"),
+        ("followers", "INTEGER NOT NULL DEFAULT 0"),
+        ("popularity", "INTEGER NOT NULL DEFAULT 0"),
+        ("popularity_rank", "INTEGER NOT NULL DEFAULT 0"),
+        ("catalog_hash", "TEXT"),
+    ])
+    if artist_columns is not None:
+        _backfill_nulls(conn, "artists", [
+            ("spotify_id", "'legacy-' || id"),
+            ("spotify_uri", "'spotify:artist:legacy-' || id"),
         ])
-        if artist_columns is not None:
-            conn.execute(text("UPDATE artists SET spotify_id = COALESCE(spotify_id, 'legacy-' || id)"))
-            conn.execute(text("UPDATE artists SET spotify_uri = COALESCE(spotify_uri, 'spotify:artist:legacy-' || id)"))
-            conn.execute(text("UPDATE artists SET followers = COALESCE(followers, 0)"))
-            conn.execute(text("UPDATE artists SET popularity = COALESCE(popularity, 0)"))
-            _ensure_table_indexes(conn, "artists", [
-                ("ix_artists_spotify_id", "CREATE UNIQUE INDEX IF NOT EXISTS ix_artists_spotify_id ON artists(spotify_id)"),
-            ])
-
-        track_columns = _ensure_table_columns(conn, "tracks", [
-            ("spotify_id", "TEXT"),
-            ("spotify_uri", "TEXT"),
-            ("album_name", "TEXT"),
-            ("album_uri", "TEXT"),
-            ("album_image_url", "TEXT"),
-            ("disc_number", "INTEGER NOT NULL DEFAULT 1"),
-            ("track_number", "INTEGER NOT NULL DEFAULT 0"),
-            ("explicit", "BOOLEAN NOT NULL DEFAULT 0"),
-            ("preview_url", "TEXT"),
-            ("isrc", "TEXT"),
-            ("popularity", "INTEGER NOT NULL DEFAULT 0"),
+        # Schema version 10 moves the sync's catalog hash out of the public metadata JSON.
+        conn.execute(text(
+            "UPDATE artists SET catalog_hash = COALESCE(catalog_hash, json_extract(metadata, '$.catalog_hash')), "
+            "metadata = json_remove(metadata, '$.catalog_hash') "
+            "WHERE json_valid(metadata) AND json_type(metadata, '$.catalog_hash') IS NOT NULL"
+        ))
+        conn.execute(
+            text(
+                "UPDATE artists SET popularity_rank = popularity * :shift + MIN(MAX(followers, 0), :shift - 1)"
+            ),
+            {"shift": models.POPULARITY_RANK_SHIFT},
+        )
+        conn.execute(text("DROP INDEX IF EXISTS ix_artists_rank"))
+        _ensure_table_indexes(conn, indexes["artists"], [
+            ("ix_artists_spotify_id", "CREATE UNIQUE INDEX IF NOT EXISTS ix_artists_spotify_id ON artists(spotify_id)"),
+            (
+                "ix_artists_popularity_rank",
+                "CREATE INDEX IF NOT EXISTS ix_artists_popularity_rank ON artists(popularity_rank DESC, id)",
+            ),
         ])
-        if track_columns is not None:
-            conn.execute(text("UPDATE tracks SET spotify_id = COALESCE(spotify_id, 'legacy-' || id)"))
-            conn.execute(text("UPDATE tracks SET spotify_uri = COALESCE(spotify_uri, uri, 'spotify:track:legacy-' || id)"))
-            conn.execute(text("UPDATE tracks SET album_name = COALESCE(album_name, '')"))
-            conn.execute(text("UPDATE tracks SET album_uri = COALESCE(album_uri, '')"))
-            conn.execute(text("UPDATE tracks SET disc_number = COALESCE(disc_number, 1)"))
-            conn.execute(text("UPDATE tracks SET track_number = COALESCE(track_number, 0)"))
-            conn.execute(text("UPDATE tracks SET explicit = COALESCE(explicit, 0)"))
-            conn.execute(text("UPDATE tracks SET preview_url = COALESCE(preview_url, '')"))
-            conn.execute(text("UPDATE tracks SET isrc = COALESCE(isrc, '')"))
-            conn.execute(text("UPDATE tracks SET popularity = COALESCE(popularity, 0)"))
-            _ensure_table_indexes(conn, "tracks", [
-                ("ix_tracks_spotify_id", "CREATE UNIQUE INDEX IF NOT EXISTS ix_tracks_spotify_id ON tracks(spotify_id)"),
-            ])
+
+    track_columns = _ensure_table_columns(conn, "tracks", columns.get("tracks"), [
+        ("spotify_id", "TEXT"),
+        ("spotify_uri", "TEXT"),
+        ("album_name", "TEXT"),
+        ("album_uri", "TEXT"),
+        ("album_image_url", "TEXT"),
+        ("disc_number", "INTEGER NOT NULL DEFAULT 1"),
+        ("track_number", "INTEGER NOT NULL DEFAULT 0"),
+        ("explicit", "BOOLEAN NOT NULL DEFAULT 0"),
+        ("preview_url", "TEXT"),
+        ("isrc", "TEXT"),
+        ("popularity", "INTEGER NOT NULL DEFAULT 0"),
+    ])
+    if track_columns is not None:
+        _backfill_nulls(conn, "tracks", [
+            ("spotify_id", "'legacy-' || id"),
+            ("spotify_uri", "COALESCE(uri, 'spotify:track:legacy-' || id)"),
+            ("album_name", "''"),
+            ("album_uri", "''"),
+            ("preview_url", "''"),
+            ("isrc", "''"),
+        ])
+        _ensure_table_indexes(conn, indexes["tracks"], [
+            ("ix_tracks_spotify_id", "CREATE UNIQUE INDEX IF NOT EXISTS ix_tracks_spotify_id ON tracks(spotify_id)"),
+        ])
+
+    if "spotify_auth_state" in indexes:
+        _ensure_table_indexes(conn, indexes["spotify_auth_state"], [
+            (
+                "ix_spotify_auth_state_created_at",
+                "CREATE INDEX IF NOT EXISTS ix_spotify_auth_state_created_at ON spotify_auth_state(created_at)",
+            ),
+        ])
+
+    # Composite indexes backing the router list queries (schema version 7) and the
+    # open-history lookup (version 8); the definitions live on the models, so
+    # create whichever ones are missing.
+    for table_name in ("rooms", "tracks", "chat_messages", "recommendation_events", "room_track_history"):
+        for index in models.Base.metadata.tables[table_name].indexes:
+            index.create(conn, checkfirst=True)
+
+    _pack_embedding_vectors(conn)
+    if _ensure_table_columns(conn, "embeddings", columns.get("embeddings"), [
+        ("norm", "REAL NOT NULL DEFAULT 0"),
+    ]) is not None:
+        _backfill_embedding_norms(conn)
+
+
+def _pack_embedding_vectors(conn) -> None:
+    # Schema version 4 stores embedding vectors as float32 bytes; convert legacy JSON text rows.
+    rows = conn.execute(text("SELECT id, vector FROM embeddings WHERE typeof(vector) = 'text'")).all()
+    for embedding_id, raw in rows:
+        packed = array("f", orjson.loads(raw) or []).tobytes()
+        conn.execute(text("UPDATE embeddings SET vector = :vector WHERE id = :id"), {"vector": packed, "id": embedding_id})
+
+
+def _backfill_embedding_norms(conn) -> None:
+    # Schema version 9 stores each vector's norm; SQLite cannot compute it from
+    # the packed bytes, so fill rows that still carry the column default here.
+    from .models import embedding_norm
+
+    rows = conn.execute(text("SELECT id, vector FROM embeddings WHERE norm = 0")).all()
+    for embedding_id, raw in rows:
+        vector = array("f")
+        vector.frombytes(raw or b"")
+        conn.execute(
+            text("UPDATE embeddings SET norm = :norm WHERE id = :id"),
+            {"norm": embedding_norm(vector), "id": embedding_id},
+        )
 
 
 def init_db() -> None:
@@ -143,5 +440,29 @@ def init_db() -> None:
 
     from . import models  # noqa: F401 ensures model metadata is registered
 
+    schema_version, has_users = _sqlite_schema_state()
+    if schema_version == CURRENT_SCHEMA_VERSION and has_users:
+        # Created and migrated by an earlier start; skip the create_all and
+        # migration probes, but still let the planner refresh its statistics.
+        # A current version without a users table means the file was emptied,
+        # so that case falls through and rebuilds the schema.
+        optimize_db()
+        return
     models.Base.metadata.create_all(bind=_engine)
-    _apply_sqlite_migrations()
+    _apply_sqlite_migrations(schema_version)
+
+
+def optimize_db() -> None:
+    """Let SQLite refresh planner statistics; intended for shutdown."""
+
+    if _engine.dialect.name != "sqlite":
+        return
+    # optimize may write sqlite_stat1, so run it in a transaction that commits.
+    with _engine.begin() as conn:
+        conn.execute(text("PRAGMA optimize"))
+
+
+async def dispose_async_engine() -> None:
+    """Close pooled async connections; intended for shutdown."""
+
+    await _async_engine.dispose()
@@ -1,17 +1,20 @@
 ﻿from datetime import datetime, timezone
+import asyncio
+import contextlib
 import logging
 import os
 from pathlib import Path
 from typing import List
 
+import httpx
 from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 
-from .database import SessionLocal, init_db
-from .routers import api_router, auth
-from .services import SpotifyCatalogSync
+from .database import SessionLocal, dispose_async_engine, init_db, optimize_db
+from .routers import auth, build_api_router
+from .services import SpotifyCatalogSync, close_token_client
 from .schemas import HealthResponse
 from .utils.credentials import ensure_spotify_credentials_env
 
@@ -25,6 +28,8 @@ DEFAULT_ALLOWED_ORIGINS: List[str] = [
     "http://localhost:5173",
 ]
 
+AUTH_STATE_SWEEP_INTERVAL_SECONDS = 3600
+
 ensure_spotify_credentials_env()
 
 os.environ.setdefault("SPOTIFY_REDIRECT_URI", "https://b60b27862c26.ngrok-free.app/auth/spotify/callback")
@@ -42,6 +47,13 @@ def _frontend_dist_path() -> Path:
 
 
 
+def _enabled_api_routers() -> List[str] | None:
+    raw = os.getenv("API_ROUTERS")
+    if not raw:
+        return None
+    return [name.strip() for name in raw.split(",") if name.strip()]
+
+
 def _is_truthy(value: str | None) -> bool:
     if value is None:
         return False
@@ -66,7 +78,12 @@ def _seed_catalog_if_configured() -> None:
 
     market = os.getenv("SPOTIFY_CATALOG_MARKET", "US")
     logger.info("Seeding Spotify catalog for %s artists (market=%s)", len(artist_ids), market)
-    syncer = SpotifyCatalogSync(client_id, client_secret, market=market)
+    syncer = SpotifyCatalogSync(
+        client_id,
+        client_secret,
+        market=market,
+        album_cache_path=os.getenv("SPOTIFY_ALBUM_CACHE_PATH"),
+    )
     with SessionLocal() as session:
         stats = syncer.sync(session, artist_ids)
 
@@ -82,10 +99,22 @@ def _seed_catalog_if_configured() -> None:
     )
 
 
+async def _sweep_auth_states_periodically() -> None:
+    while True:
+        try:
+            removed = await auth.purge_expired_auth_states()
+            if removed:
+                logger.info("Removed %s expired Spotify auth states", removed)
+        except Exception:  # pragma: no cover - background job
+            logger.exception("Expired Spotify auth state sweep failed")
+        await asyncio.sleep(AUTH_STATE_SWEEP_INTERVAL_SECONDS)
+
+
 app = FastAPI(
     title="Looproom Prototype API",
     version="0.1.0",
     summary="Backend service for music rooms, chat, and recommendations",
+    default_response_class=ORJSONResponse,
 )
 
 raw_origins = os.getenv("FRONTEND_ORIGINS")
@@ -96,20 +125,41 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Let cross-origin clients read the list pagination cursor.
+    expose_headers=["X-Next-Cursor"],
 )
 
 
 @app.on_event("startup")
 def on_startup() -> None:
+    # One pooled client for outbound Spotify calls so requests reuse keep-alive connections.
+    app.state.http_client = httpx.AsyncClient(
+        http2=True,
+        timeout=10,
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+    )
     init_db()
     try:
         _seed_catalog_if_configured()
     except Exception:  # pragma: no cover - startup side effect
         logger.exception("Spotify catalog seed failed during startup")
+    app.state.auth_state_sweeper = asyncio.get_running_loop().create_task(_sweep_auth_states_periodically())
+
+
+@app.on_event("shutdown")
+async def on_shutdown() -> None:
+    sweeper = app.state.auth_state_sweeper
+    sweeper.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await sweeper
+    await app.state.http_client.aclose()
+    close_token_client()
+    optimize_db()
+    await dispose_async_engine()
 
 
 app.include_router(auth.router)
-app.include_router(api_router)
+app.include_router(build_api_router(_enabled_api_routers()))
 
 @app.get("/health", response_model=HealthResponse, tags=["system"])
 def healthcheck() -> HealthResponse:
@@ -120,23 +170,60 @@ _frontend_dist = _frontend_dist_path()
 _index_file = _frontend_dist / "index.html"
 _assets_dir = _frontend_dist / "assets"
 
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+INDEX_CACHE_CONTROL = "no-cache"
+
+
+class _HashedAssetFiles(StaticFiles):
+    """Static files whose names carry a content hash, so browsers may cache them forever."""
+
+    def file_response(self, *args, **kwargs) -> Response:
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        return response
+
+
+def _scan_frontend_files(root: Path) -> dict[str, tuple[Path, os.stat_result]]:
+    files: dict[str, tuple[Path, os.stat_result]] = {}
+    pending = [(root, "")]
+    while pending:
+        directory, prefix = pending.pop()
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                relative = f"{prefix}{entry.name}"
+                if entry.is_dir():
+                    pending.append((Path(entry.path), f"{relative}/"))
+                elif entry.is_file():
+                    files[relative] = (Path(entry.path), entry.stat())
+    return files
+
+
 if _index_file.exists():
+    # Snapshot the build output once (paths and stat results) so serving a file
+    # needs neither a pathlib join nor a stat call per request.
+    _frontend_files = _scan_frontend_files(_frontend_dist)
+    _index_stat = _index_file.stat()
+
     if _assets_dir.is_dir():
-        app.mount("/assets", StaticFiles(directory=_assets_dir), name="frontend-assets")
+        app.mount("/assets", _HashedAssetFiles(directory=_assets_dir), name="frontend-assets")
+
+    def _index_response() -> FileResponse:
+        return FileResponse(
+            _index_file,
+            stat_result=_index_stat,
+            headers={"Cache-Control": INDEX_CACHE_CONTROL},
+        )
 
     @app.get("/", include_in_schema=False)
     async def serve_root() -> FileResponse:
-        return FileResponse(_index_file)
+        return _index_response()
 
     @app.get("/{full_path:path}", include_in_schema=False)
     async def serve_spa(full_path: str) -> Response:
         if full_path.startswith(("api/", "ws/")):
             return Response(status_code=404)
-        target = _frontend_dist / full_path
-        if target.is_file():
-            return FileResponse(target)
-        return FileResponse(_index_file)
-
-
-
-
+        cached = _frontend_files.get(full_path) if full_path != "index.html" else None
+        if cached is not None:
+            target, stat_result = cached
+            return FileResponse(target, stat_result=stat_result)
+        return _index_response()
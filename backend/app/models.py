@@ -1,9 +1,13 @@
 ﻿from __future__ import annotations
 
-from datetime import datetime
+from array import array
+from datetime import datetime, timezone
 from typing import Any, Dict, List, Optional
-from uuid import uuid4
+from uuid import UUID
 import enum
+import math
+import os
+import time
 
 from sqlalchemy import (
     JSON,
@@ -12,12 +16,19 @@ from sqlalchemy import (
     Enum,
     Float,
     ForeignKey,
+    Index,
     Integer,
+    LargeBinary,
     String,
     Text,
+    TypeDecorator,
     UniqueConstraint,
+    desc,
+    text,
 )
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy.sql.functions import FunctionElement
 
 from .database import Base
 
@@ -63,26 +74,102 @@ class EntityKind(str, enum.Enum):
     ARTIST = "artist"
 
 
+class UTCDateTime(TypeDecorator):
+    """Timezone-aware UTC datetimes, including on SQLite, which stores them without an offset."""
+
+    impl = DateTime(timezone=True)
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None or value.tzinfo is None:
+            return value
+        value = value.astimezone(timezone.utc)
+        # Only SQLite needs the offset stripped; timestamptz backends keep it.
+        if dialect.name == "sqlite":
+            return value.replace(tzinfo=None)
+        return value
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if value.tzinfo is None:
+            return value.replace(tzinfo=timezone.utc)
+        return value.astimezone(timezone.utc)
+
+
+class utc_now(FunctionElement):
+    """Current UTC time evaluated by the database inside the INSERT/UPDATE statement."""
+
+    type = UTCDateTime()
+    inherit_cache = True
+
+
+@compiles(utc_now)
+def _compile_utc_now(element: utc_now, compiler: Any, **kw: Any) -> str:
+    return "CURRENT_TIMESTAMP"
+
+
+@compiles(utc_now, "sqlite")
+def _compile_utc_now_sqlite(element: utc_now, compiler: Any, **kw: Any) -> str:
+    # CURRENT_TIMESTAMP only has second precision on SQLite; keep milliseconds so
+    # created_at still orders chat messages and queue entries sensibly.
+    return "STRFTIME('%Y-%m-%d %H:%M:%f', 'now')"
+
+
 class TimestampMixin:
+    # Timestamp defaults are generated in SQL; fetch them back with RETURNING on
+    # flush so reading them afterwards never needs another SELECT.
+    __mapper_args__ = {"eager_defaults": True}
+
     created_at: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True), default=datetime.utcnow, nullable=False
+        UTCDateTime(), default=utc_now(), nullable=False
     )
     updated_at: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True),
-        default=datetime.utcnow,
-        onupdate=datetime.utcnow,
+        UTCDateTime(),
+        default=utc_now(),
+        onupdate=utc_now(),
         nullable=False,
     )
 
 
-def _uuid() -> str:
-    return str(uuid4())
+def uuid7() -> str:
+    """Return a time-ordered (version 7) UUID so new keys land at the end of their index."""
+
+    unix_ms = time.time_ns() // 1_000_000
+    rand = int.from_bytes(os.urandom(10), "big")
+    value = (
+        (unix_ms & 0xFFFF_FFFF_FFFF) << 80
+        | 0x7 << 76
+        | ((rand >> 62) & 0xFFF) << 64
+        | 0b10 << 62
+        | (rand & 0x3FFF_FFFF_FFFF_FFFF)
+    )
+    return str(UUID(int=value))
+
+
+class Float32Vector(TypeDecorator):
+    """Stores a float vector as packed float32 bytes instead of JSON text."""
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return array("f", value).tobytes()
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        vector = array("f")
+        vector.frombytes(value)
+        return vector.tolist()
 
 
 class User(TimestampMixin, Base):
     __tablename__ = "users"
 
-    id: Mapped[str] = mapped_column(String(36), primary_key=True, default=_uuid)
+    id: Mapped[str] = mapped_column(String(36), primary_key=True, default=uuid7)
     spotify_id: Mapped[str] = mapped_column(String(64), unique=True, nullable=False)
     display_name: Mapped[str] = mapped_column(String(120), nullable=False)
     avatar_url: Mapped[Optional[str]] = mapped_column(String(512))
@@ -93,25 +180,28 @@ class User(TimestampMixin, Base):
     preferences: Mapped[Dict[str, Any]] = mapped_column(JSON, default=dict)
     access_token: Mapped[str] = mapped_column(String(512), nullable=False)
     refresh_token: Mapped[str] = mapped_column(String(512), nullable=False)
-    token_expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    token_expires_at: Mapped[datetime] = mapped_column(UTCDateTime(), nullable=False)
     scope: Mapped[Optional[str]] = mapped_column(String(512))
     reputation: Mapped[float] = mapped_column(Float, default=0.0)
 
     messages: Mapped[List["ChatMessage"]] = relationship(
-        back_populates="author", cascade="all, delete-orphan"
+        back_populates="author", cascade="all, delete-orphan", lazy="raise_on_sql"
     )
     reactions: Mapped[List["Reaction"]] = relationship(
-        back_populates="user", cascade="all, delete-orphan"
+        back_populates="user", cascade="all, delete-orphan", lazy="raise_on_sql"
     )
     memberships: Mapped[List["RoomMembership"]] = relationship(
-        back_populates="user", cascade="all, delete-orphan"
+        back_populates="user", cascade="all, delete-orphan", lazy="raise_on_sql"
     )
 
 
 class Artist(TimestampMixin, Base):
     __tablename__ = "artists"
+    __table_args__ = (
+        Index("ix_artists_popularity_rank", desc("popularity_rank"), "id"),
+    )
 
-    id: Mapped[str] = mapped_column(String(36), primary_key=True, default=_uuid)
+    id: Mapped[str] = mapped_column(String(36), primary_key=True, default=uuid7)
     spotify_id: Mapped[str] = mapped_column(String(64), unique=True, nullable=False)
     spotify_uri: Mapped[str] = mapped_column(String(64), unique=True, nullable=False)
     spotify_url: Mapped[Optional[str]] = mapped_column(String(512))
@@ -119,23 +209,39 @@ class Artist(TimestampMixin, Base):
     metadata_json: Mapped[Dict[str, Any]] = mapped_column("metadata", JSON, default=dict)
     followers: Mapped[int] = mapped_column(Integer, default=0)
     popularity: Mapped[int] = mapped_column(Integer, default=0)
+    popularity_rank: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
     official_flag: Mapped[bool] = mapped_column(Boolean, default=False)
+    # Digest of the album ids seen by the last catalogue sync; internal, never serialised.
+    catalog_hash: Mapped[Optional[str]] = mapped_column(String(32))
+
+    rooms: Mapped[List["Room"]] = relationship(back_populates="artist", lazy="raise_on_sql")
+    tracks: Mapped[List["Track"]] = relationship(back_populates="artist", lazy="raise_on_sql")
+
 
-    rooms: Mapped[List["Room"]] = relationship(back_populates="artist")
-    tracks: Mapped[List["Track"]] = relationship(back_populates="artist")
+# Follower counts stay far below 2**40, so popularity and followers pack into a
+# single integer that sorts the same way as (popularity DESC, followers DESC).
+POPULARITY_RANK_SHIFT = 1 << 40
+
+
+def artist_popularity_rank(popularity: int, followers: int) -> int:
+    return popularity * POPULARITY_RANK_SHIFT + min(max(followers, 0), POPULARITY_RANK_SHIFT - 1)
 
 
 
 class Room(TimestampMixin, Base):
     __tablename__ = "rooms"
+    __table_args__ = (
+        Index("ix_rooms_created_at", "created_at"),
+        Index("ix_rooms_artist_created", "artist_id", "created_at"),
+    )
 
-    id: Mapped[str] = mapped_column(String(36), primary_key=True, default=_uuid)
+    id: Mapped[str] = mapped_column(String(36), primary_key=True, default=uuid7)
     artist_id: Mapped[str] = mapped_column(ForeignKey("artists.id"), nullable=False)
     name: Mapped[str] = mapped_column(String(160), nullable=False)
     description: Mapped[Optional[str]] = mapped_column(Text)
     mode: Mapped[RoomMode] = mapped_column(Enum(RoomMode), default=RoomMode.LIVE)
     rules: Mapped[Dict[str, Any]] = mapped_column(JSON, default=dict)
-    pinned_message_ids: Mapped[List[str]] = mapped_column(JSON, default=list)
+    pinned_message_ids: Mapped[List[int]] = mapped_column(JSON, default=list)
     live_track_id: Mapped[Optional[str]] = mapped_column(
         ForeignKey("tracks.id", ondelete="SET NULL"), nullable=True
     )
@@ -152,31 +258,35 @@ class Room(TimestampMixin, Base):
         cascade="all, delete-orphan",
     )
     messages: Mapped[List["ChatMessage"]] = relationship(
-        back_populates="room", cascade="all, delete-orphan"
+        back_populates="room", cascade="all, delete-orphan", lazy="raise_on_sql"
     )
     queue_entries: Mapped[List["QueueEntry"]] = relationship(
         back_populates="room",
         cascade="all, delete-orphan",
         order_by="QueueEntry.position",
+        lazy="raise_on_sql",
     )
     memberships: Mapped[List["RoomMembership"]] = relationship(
-        back_populates="room", cascade="all, delete-orphan"
+        back_populates="room", cascade="all, delete-orphan", lazy="raise_on_sql"
     )
     histories: Mapped[List["RoomTrackHistory"]] = relationship(
-        back_populates="room", cascade="all, delete-orphan"
+        back_populates="room", cascade="all, delete-orphan", lazy="raise_on_sql"
     )
     voice_sessions: Mapped[List["VoiceSession"]] = relationship(
-        back_populates="room", cascade="all, delete-orphan"
+        back_populates="room", cascade="all, delete-orphan", lazy="raise_on_sql"
     )
     recommendation_events: Mapped[List["RecommendationEvent"]] = relationship(
-        back_populates="room", cascade="all, delete-orphan"
+        back_populates="room", cascade="all, delete-orphan", lazy="raise_on_sql"
     )
 
 
 class Track(TimestampMixin, Base):
     __tablename__ = "tracks"
+    __table_args__ = (
+        Index("ix_tracks_artist_popularity", "artist_id", "popularity", "created_at"),
+    )
 
-    id: Mapped[str] = mapped_column(String(36), primary_key=True, default=_uuid)
+    id: Mapped[str] = mapped_column(String(36), primary_key=True, default=uuid7)
     artist_id: Mapped[str] = mapped_column(ForeignKey("artists.id"), nullable=False)
     spotify_id: Mapped[str] = mapped_column(String(64), unique=True, nullable=False)
     spotify_uri: Mapped[str] = mapped_column(String(64), unique=True, nullable=False)
@@ -190,30 +300,30 @@ class Track(TimestampMixin, Base):
     track_number: Mapped[int] = mapped_column(Integer, default=0)
     explicit: Mapped[bool] = mapped_column(Boolean, default=False)
     preview_url: Mapped[Optional[str]] = mapped_column(String(512))
-    isrc: Mapped[Optional[str]] = mapped_column(String(32))
+    isrc: Mapped[Optional[str]] = mapped_column(String(12))
     popularity: Mapped[int] = mapped_column(Integer, default=0)
     audio_features: Mapped[Dict[str, Any]] = mapped_column(JSON, default=dict)
     lyrics_ref: Mapped[Optional[str]] = mapped_column(String(255))
     play_count: Mapped[int] = mapped_column(Integer, default=0)
     skip_count: Mapped[int] = mapped_column(Integer, default=0)
-    last_played_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    last_played_at: Mapped[Optional[datetime]] = mapped_column(UTCDateTime())
 
     artist: Mapped["Artist"] = relationship(back_populates="tracks")
-    histories: Mapped[List["RoomTrackHistory"]] = relationship(back_populates="track")
-    queue_entries: Mapped[List["QueueEntry"]] = relationship(back_populates="track")
-    playback_states: Mapped[List["PlaybackState"]] = relationship(back_populates="track")
+    histories: Mapped[List["RoomTrackHistory"]] = relationship(back_populates="track", lazy="raise_on_sql")
+    queue_entries: Mapped[List["QueueEntry"]] = relationship(back_populates="track", lazy="raise_on_sql")
+    playback_states: Mapped[List["PlaybackState"]] = relationship(back_populates="track", lazy="raise_on_sql")
 
 
 
 class PlaybackState(TimestampMixin, Base):
     __tablename__ = "playback_states"
 
-    id: Mapped[str] = mapped_column(String(36), primary_key=True, default=_uuid)
+    id: Mapped[str] = mapped_column(String(36), primary_key=True, default=uuid7)
     room_id: Mapped[str] = mapped_column(ForeignKey("rooms.id"), unique=True)
     track_id: Mapped[str] = mapped_column(ForeignKey("tracks.id"), nullable=False)
-    start_ts: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    start_ts: Mapped[datetime] = mapped_column(UTCDateTime(), nullable=False)
     anchor_server_ts: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True), default=datetime.utcnow, nullable=False
+        UTCDateTime(), default=utc_now(), nullable=False
     )
     offset_ms: Mapped[int] = mapped_column(Integer, default=0)
     is_paused: Mapped[bool] = mapped_column(Boolean, default=False)
@@ -227,13 +337,21 @@ class RoomTrackHistory(Base):
     __tablename__ = "room_track_history"
     __table_args__ = (
         UniqueConstraint("room_id", "played_at", name="uq_room_track_play"),
+        # Only the open (not yet ended) plays are looked up when a track changes.
+        Index(
+            "ix_room_track_history_open",
+            "room_id",
+            "track_id",
+            sqlite_where=text("ended_at IS NULL"),
+            postgresql_where=text("ended_at IS NULL"),
+        ),
     )
 
-    id: Mapped[str] = mapped_column(String(36), primary_key=True, default=_uuid)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     room_id: Mapped[str] = mapped_column(ForeignKey("rooms.id"), nullable=False)
     track_id: Mapped[str] = mapped_column(ForeignKey("tracks.id"), nullable=False)
-    played_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
-    ended_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    played_at: Mapped[datetime] = mapped_column(UTCDateTime(), nullable=False)
+    ended_at: Mapped[Optional[datetime]] = mapped_column(UTCDateTime())
     was_skipped: Mapped[bool] = mapped_column(Boolean, default=False)
     score_snapshot: Mapped[Optional[Dict[str, Any]]] = mapped_column(JSON, default=dict)
 
@@ -247,16 +365,16 @@ class RoomMembership(TimestampMixin, Base):
         UniqueConstraint("room_id", "user_id", name="uq_room_user"),
     )
 
-    id: Mapped[str] = mapped_column(String(36), primary_key=True, default=_uuid)
+    id: Mapped[str] = mapped_column(String(36), primary_key=True, default=uuid7)
     room_id: Mapped[str] = mapped_column(ForeignKey("rooms.id"), nullable=False)
     user_id: Mapped[str] = mapped_column(ForeignKey("users.id"), nullable=False)
     role: Mapped[MembershipRole] = mapped_column(
         Enum(MembershipRole), default=MembershipRole.MEMBER
     )
     joined_at: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True), default=datetime.utcnow, nullable=False
+        UTCDateTime(), default=utc_now(), nullable=False
     )
-    left_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    left_at: Mapped[Optional[datetime]] = mapped_column(UTCDateTime())
 
     room: Mapped["Room"] = relationship(back_populates="memberships")
     user: Mapped["User"] = relationship(back_populates="memberships")
@@ -268,7 +386,7 @@ class QueueEntry(TimestampMixin, Base):
         UniqueConstraint("room_id", "position", name="uq_room_queue_position"),
     )
 
-    id: Mapped[str] = mapped_column(String(36), primary_key=True, default=_uuid)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     room_id: Mapped[str] = mapped_column(ForeignKey("rooms.id"), nullable=False)
     track_id: Mapped[str] = mapped_column(ForeignKey("tracks.id"), nullable=False)
     requested_by_id: Mapped[Optional[str]] = mapped_column(ForeignKey("users.id"))
@@ -282,8 +400,11 @@ class QueueEntry(TimestampMixin, Base):
 
 class ChatMessage(TimestampMixin, Base):
     __tablename__ = "chat_messages"
+    __table_args__ = (
+        Index("ix_chat_messages_room_created", "room_id", "created_at"),
+    )
 
-    id: Mapped[str] = mapped_column(String(36), primary_key=True, default=_uuid)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     room_id: Mapped[str] = mapped_column(ForeignKey("rooms.id"), nullable=False)
     user_id: Mapped[str] = mapped_column(ForeignKey("users.id"), nullable=False)
     body: Mapped[str] = mapped_column(Text, nullable=False)
@@ -295,7 +416,7 @@ class ChatMessage(TimestampMixin, Base):
     room: Mapped["Room"] = relationship(back_populates="messages")
     author: Mapped["User"] = relationship(back_populates="messages")
     reactions: Mapped[List["Reaction"]] = relationship(
-        back_populates="message", cascade="all, delete-orphan"
+        back_populates="message", cascade="all, delete-orphan", lazy="raise_on_sql"
     )
 
 
@@ -305,8 +426,8 @@ class Reaction(TimestampMixin, Base):
         UniqueConstraint("message_id", "user_id", "type", name="uq_reaction_unique"),
     )
 
-    id: Mapped[str] = mapped_column(String(36), primary_key=True, default=_uuid)
-    message_id: Mapped[str] = mapped_column(ForeignKey("chat_messages.id"), nullable=False)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    message_id: Mapped[int] = mapped_column(ForeignKey("chat_messages.id"), nullable=False)
     user_id: Mapped[str] = mapped_column(ForeignKey("users.id"), nullable=False)
     type: Mapped[ReactionType] = mapped_column(Enum(ReactionType), nullable=False)
 
@@ -317,15 +438,15 @@ class Reaction(TimestampMixin, Base):
 class VoiceSession(TimestampMixin, Base):
     __tablename__ = "voice_sessions"
 
-    id: Mapped[str] = mapped_column(String(36), primary_key=True, default=_uuid)
+    id: Mapped[str] = mapped_column(String(36), primary_key=True, default=uuid7)
     room_id: Mapped[str] = mapped_column(ForeignKey("rooms.id"), nullable=False)
     sfu_room_id: Mapped[str] = mapped_column(String(120), nullable=False)
     role: Mapped[VoiceRole] = mapped_column(Enum(VoiceRole), default=VoiceRole.HOST)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
     started_at: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True), default=datetime.utcnow, nullable=False
+        UTCDateTime(), default=utc_now(), nullable=False
     )
-    ended_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    ended_at: Mapped[Optional[datetime]] = mapped_column(UTCDateTime())
     participant_count: Mapped[int] = mapped_column(Integer, default=0)
 
     room: Mapped["Room"] = relationship(back_populates="voice_sessions")
@@ -333,8 +454,11 @@ class VoiceSession(TimestampMixin, Base):
 
 class RecommendationEvent(TimestampMixin, Base):
     __tablename__ = "recommendation_events"
+    __table_args__ = (
+        Index("ix_recommendation_events_room_created", "room_id", "created_at"),
+    )
 
-    id: Mapped[str] = mapped_column(String(36), primary_key=True, default=_uuid)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     room_id: Mapped[str] = mapped_column(ForeignKey("rooms.id"), nullable=False)
     input_context: Mapped[Dict[str, Any]] = mapped_column(JSON, default=dict)
     ranked_list: Mapped[List[Dict[str, Any]]] = mapped_column(JSON, default=list)
@@ -347,7 +471,7 @@ class RecommendationEvent(TimestampMixin, Base):
 class ModerationLog(TimestampMixin, Base):
     __tablename__ = "moderation_logs"
 
-    id: Mapped[str] = mapped_column(String(36), primary_key=True, default=_uuid)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     entity_type: Mapped[EntityKind] = mapped_column(Enum(EntityKind), nullable=False)
     entity_id: Mapped[str] = mapped_column(String(36), nullable=False)
     action: Mapped[ModerationAction] = mapped_column(
@@ -360,8 +484,11 @@ class ModerationLog(TimestampMixin, Base):
 
 class SpotifyAuthState(TimestampMixin, Base):
     __tablename__ = "spotify_auth_state"
+    __table_args__ = (
+        Index("ix_spotify_auth_state_created_at", "created_at"),
+    )
 
-    id: Mapped[str] = mapped_column(String(36), primary_key=True, default=_uuid)
+    id: Mapped[str] = mapped_column(String(36), primary_key=True, default=uuid7)
     state: Mapped[str] = mapped_column(String(128), unique=True, nullable=False)
     redirect_uri: Mapped[Optional[str]] = mapped_column(String(512))
 
@@ -373,14 +500,22 @@ class Embedding(TimestampMixin, Base):
         UniqueConstraint("entity_type", "entity_id", name="uq_embedding_entity"),
     )
 
-    id: Mapped[str] = mapped_column(String(36), primary_key=True, default=_uuid)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     entity_type: Mapped[EntityKind] = mapped_column(Enum(EntityKind), nullable=False)
     entity_id: Mapped[str] = mapped_column(String(36), nullable=False)
-    vector: Mapped[List[float]] = mapped_column(JSON, default=list)
+    vector: Mapped[List[float]] = mapped_column(Float32Vector, default=list)
+    # Euclidean norm of ``vector``, stored at write time so similarity scoring only needs a dot product.
+    norm: Mapped[float] = mapped_column(Float, default=0.0, server_default="0", nullable=False)
     model_version: Mapped[str] = mapped_column(String(40), default="v0")
     dimensionality: Mapped[int] = mapped_column(Integer, default=0)
 
 
+def embedding_norm(vector: List[float]) -> float:
+    # Measure the float32 values Float32Vector stores, not the float64 input, so the
+    # norm matches the vector that is read back.
+    return math.hypot(*array("f", vector))
+
+
 __all__ = [
     "User",
     "Artist",
@@ -1,20 +1,53 @@
-﻿from fastapi import APIRouter
+﻿from __future__ import annotations
 
-from . import artists, auth, chat, embeddings, moderation, playback, recommendations, rooms, spotify, tracks, users
+from importlib import import_module
+from typing import TYPE_CHECKING, Any, Iterable, Optional
 
-api_router = APIRouter(prefix="/api")
-api_router.include_router(users.router)
-api_router.include_router(artists.router)
-api_router.include_router(tracks.router)
-api_router.include_router(rooms.router)
-api_router.include_router(playback.router)
-api_router.include_router(spotify.router)
-api_router.include_router(chat.router)
-api_router.include_router(recommendations.router)
-api_router.include_router(moderation.router)
-api_router.include_router(embeddings.router)
+from fastapi import APIRouter
 
+if TYPE_CHECKING:  # pragma: no cover - typing only
+    from . import auth  # noqa: F401
 
-__all__ = ["api_router", "auth"]
+# Feature routers mounted under /api, in registration order. Modules are imported
+# only when a router is built, so importing one router (or ``app.routers.auth``)
+# does not drag in every other feature and its services.
+API_ROUTER_MODULES = (
+    "users",
+    "artists",
+    "tracks",
+    "rooms",
+    "playback",
+    "spotify",
+    "chat",
+    "recommendations",
+    "moderation",
+    "embeddings",
+)
 
 
+def build_api_router(enabled: Optional[Iterable[str]] = None) -> APIRouter:
+    """Assemble the /api router from ``enabled`` feature modules (all of them by default)."""
+    selected = set(API_ROUTER_MODULES if enabled is None else enabled)
+    unknown = selected.difference(API_ROUTER_MODULES)
+    if unknown:
+        raise ValueError(f"Unknown API routers: {', '.join(sorted(unknown))}")
+
+    router = APIRouter(prefix="/api")
+    for name in API_ROUTER_MODULES:
+        if name in selected:
+            router.include_router(import_module(f"{__name__}.{name}").router)
+    return router
+
+
+def __getattr__(name: str) -> Any:
+    if name == "api_router":
+        value = build_api_router()
+    elif name == "auth":
+        value = import_module(f"{__name__}.auth")
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
+
+
+__all__ = ["API_ROUTER_MODULES", "api_router", "auth", "build_api_router"]
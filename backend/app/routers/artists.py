@@ -1,13 +1,50 @@
-﻿from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import select
-from sqlalchemy.orm import Session
+﻿import base64
+import binascii
+import json
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import and_, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from .. import models, schemas
-from ..database import get_session
+from ..database import get_async_session
+from ..utils.cache import artist_cache
+from .common import json_list_response
 
 
 router = APIRouter(prefix="/artists", tags=["artists"])
 
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+DEFAULT_PAGE_SIZE = 50
+
+_LIST_COLUMNS = (
+    models.Artist.id,
+    models.Artist.spotify_id,
+    models.Artist.spotify_uri,
+    models.Artist.name,
+    models.Artist.followers,
+    models.Artist.popularity,
+    models.Artist.spotify_url,
+    models.Artist.metadata_json,
+    models.Artist.official_flag,
+    models.Artist.created_at,
+    models.Artist.updated_at,
+)
+
+
+def _encode_cursor(rank: int, artist_id: str) -> str:
+    raw = json.dumps([rank, artist_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(cursor: str) -> tuple[int, str]:
+    try:
+        rank, artist_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return int(rank), str(artist_id)
+    except (binascii.Error, UnicodeError, ValueError, TypeError) as exc:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from exc
+
 
 @router.post("", response_model=schemas.ArtistRead, status_code=201)
 def create_artist(*args, **kwargs):
@@ -15,17 +52,44 @@ def create_artist(*args, **kwargs):
 
 
 @router.get("", response_model=list[schemas.ArtistRead])
-def list_artists(session: Session = Depends(get_session)):
-    artists = session.scalars(
-        select(models.Artist).order_by(models.Artist.popularity.desc(), models.Artist.followers.desc(), models.Artist.name)
-    )
-    return list(artists)
+async def list_artists(
+    limit: int | None = Query(default=None, ge=1, le=200),
+    cursor: str | None = Query(default=None),
+    session: AsyncSession = Depends(get_async_session),
+):
+    Artist = models.Artist
+    stmt = select(*_LIST_COLUMNS, Artist.popularity_rank).order_by(Artist.popularity_rank.desc(), Artist.id)
+    if cursor:
+        rank, artist_id = _decode_cursor(cursor)
+        stmt = stmt.where(
+            or_(
+                Artist.popularity_rank < rank,
+                and_(Artist.popularity_rank == rank, Artist.id > artist_id),
+            )
+        )
 
+    headers = {}
+    if limit is None and cursor is None:
+        # Callers that predate paging get the whole catalogue in one response.
+        rows = (await session.execute(stmt)).all()
+    else:
+        limit = limit or DEFAULT_PAGE_SIZE
+        rows = (await session.execute(stmt.limit(limit + 1))).all()
+        if len(rows) > limit:
+            rows = rows[:limit]
+            headers[NEXT_CURSOR_HEADER] = _encode_cursor(rows[-1].popularity_rank, rows[-1].id)
+    # Rows carry exactly the ArtistRead columns (plus popularity_rank, which the
+    # schema ignores), so the adapter reads them like ORM instances.
+    return json_list_response(schemas.ARTIST_LIST_ADAPTER, rows, headers=headers)
 
-@router.get("/{artist_id}", response_model=schemas.ArtistRead)
-def get_artist(artist_id: str, session: Session = Depends(get_session)):
-    artist = session.get(models.Artist, artist_id)
-    if not artist:
-        raise HTTPException(status_code=404, detail="Artist not found")
-    return artist
 
+@router.get("/{artist_id}", response_model=schemas.ArtistRead)
+async def get_artist(artist_id: str, session: AsyncSession = Depends(get_async_session)):
+    payload = artist_cache.get(artist_id)
+    if payload is None:
+        artist = await session.get(models.Artist, artist_id)
+        if not artist:
+            raise HTTPException(status_code=404, detail="Artist not found")
+        payload = schemas.ArtistRead.model_validate(artist).model_dump(mode="json")
+        artist_cache.set(artist_id, payload)
+    return ORJSONResponse(payload)
@@ -3,6 +3,7 @@ from __future__ import annotations
 import logging
 
 import os
+import random
 import secrets
 from datetime import datetime, timedelta, timezone
 from typing import Optional
@@ -11,12 +12,15 @@ from urllib.parse import urlencode
 import httpx
 from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from fastapi.responses import RedirectResponse
-from sqlalchemy import delete, select
+from sqlalchemy import delete, exists, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from .. import models, schemas
-from ..database import get_session
-from ..security import clear_session_cookie, create_session_token, set_session_cookie
+from ..database import AsyncSessionLocal, get_async_session, get_session
+from ..security import SESSION_COOKIE_NAME, clear_session_cookie, create_session_token, set_session_cookie
+from ..utils.cache import session_user_cache, spotify_token_cache
 
 logger = logging.getLogger(__name__)
 
@@ -28,8 +32,41 @@ DEFAULT_SCOPES = os.getenv(
     "user-read-email user-read-private user-read-playback-state user-modify-playback-state",
 )
 
+AUTH_STATE_TTL = timedelta(minutes=10)
+# Expired states are purged by a periodic job (see main.py); logins only sweep
+# occasionally so a process without that job still converges.
+LOGIN_SWEEP_PROBABILITY = 0.01
+
 router = APIRouter(prefix="/auth", tags=["auth"])
 
+# Dialect-specific INSERT constructs providing ON CONFLICT DO UPDATE for the login upsert.
+_UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def _upsert_insert(session: AsyncSession, table):
+    dialect = session.bind.dialect.name
+    try:
+        return _UPSERT_INSERTS[dialect](table)
+    except KeyError:
+        raise RuntimeError(f"Spotify login upsert is not supported on the {dialect} dialect") from None
+
+
+def _delete_expired_auth_states():
+    cutoff = datetime.now(timezone.utc) - AUTH_STATE_TTL
+    return (
+        delete(models.SpotifyAuthState)
+        .where(models.SpotifyAuthState.created_at < cutoff)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def purge_expired_auth_states() -> int:
+    """Delete auth states older than the OAuth window; returns the number removed."""
+
+    async with AsyncSessionLocal() as session, session.begin():
+        result = await session.execute(_delete_expired_auth_states())
+    return result.rowcount
+
 
 def _client_credentials() -> tuple[str, str]:
     client_id = os.getenv("SPOTIFY_CLIENT_ID")
@@ -57,11 +94,8 @@ def spotify_login(
     client_id, _ = _client_credentials()
     callback_uri = _resolve_redirect_uri(request)
 
-    # Clean up expired auth states (older than 10 minutes)
-    cutoff = datetime.utcnow() - timedelta(minutes=10)
-    session.execute(
-        delete(models.SpotifyAuthState).where(models.SpotifyAuthState.created_at < cutoff)
-    )
+    if random.random() < LOGIN_SWEEP_PROBABILITY:
+        session.execute(_delete_expired_auth_states())
 
     state = secrets.token_urlsafe(32)
     auth_state = models.SpotifyAuthState(state=state, redirect_uri=redirect_uri)
@@ -86,33 +120,32 @@ async def spotify_callback(
     request: Request,
     code: str,
     state: str,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
 ):
     logger.info("Handling Spotify callback: state=%s", state)
     client_id, client_secret = _client_credentials()
     callback_uri = _resolve_redirect_uri(request)
 
-    auth_state = session.scalar(
-        select(models.SpotifyAuthState).where(models.SpotifyAuthState.state == state)
-    )
-    if not auth_state:
+    # Reject unknown states before talking to Spotify. This is a read-only check
+    # whose transaction ends before the round trips; the state is consumed below.
+    async with session.begin():
+        known_state = await session.scalar(
+            select(exists().where(models.SpotifyAuthState.state == state))
+        )
+    if not known_state:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid state")
 
-    redirect_target = auth_state.redirect_uri or "/"
-    session.delete(auth_state)
-    session.commit()
-
-    async with httpx.AsyncClient(timeout=10) as client:
-        token_res = await client.post(
-            SPOTIFY_TOKEN_URL,
-            data={
-                "grant_type": "authorization_code",
-                "code": code,
-                "redirect_uri": callback_uri,
-                "client_id": client_id,
-                "client_secret": client_secret,
-            },
-        )
+    client: httpx.AsyncClient = request.app.state.http_client
+    token_res = await client.post(
+        SPOTIFY_TOKEN_URL,
+        data={
+            "grant_type": "authorization_code",
+            "code": code,
+            "redirect_uri": callback_uri,
+            "client_id": client_id,
+            "client_secret": client_secret,
+        },
+    )
     if token_res.status_code != 200:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Token exchange failed")
 
@@ -122,13 +155,14 @@ async def spotify_callback(
     expires_in = int(token_data.get("expires_in", 3600))
     scope = token_data.get("scope")
 
-    async with httpx.AsyncClient(timeout=10) as client:
-        me_res = await client.get(
-            SPOTIFY_ME_URL,
-            headers={"Authorization": f"Bearer {access_token}"},
-        )
+    me_res = await client.get(
+        SPOTIFY_ME_URL,
+        headers={"Authorization": f"Bearer {access_token}"},
+    )
     if me_res.status_code != 200:
-        logger.error("Spotify profile fetch failed: status=%s body=%s", me_res.status_code, me_res.text)
+        if logger.isEnabledFor(logging.ERROR):
+            # Only decode the response body when the record will actually be emitted.
+            logger.error("Spotify profile fetch failed: status=%s body=%s", me_res.status_code, me_res.text)
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Failed to load profile")
 
     profile = me_res.json()
@@ -144,42 +178,71 @@ async def spotify_callback(
         if isinstance(first_image, dict):
             avatar_url = first_image.get("url")
 
-    user = session.scalar(
-        select(models.User).where(models.User.spotify_id == spotify_id)
-    )
-    if user is None:
-        if refresh_token is None:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Missing refresh token")
-        user = models.User(
+    # Consume the state and upsert the user in a single write transaction.
+    async with session.begin():
+        # DELETE ... RETURNING consumes the nonce atomically; a concurrent callback
+        # with the same state gets no row back.
+        consumed = (
+            await session.execute(
+                delete(models.SpotifyAuthState)
+                .where(models.SpotifyAuthState.state == state)
+                .returning(models.SpotifyAuthState.redirect_uri)
+            )
+        ).first()
+        if consumed is None:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid state")
+        redirect_target = consumed.redirect_uri or "/"
+
+        # One upsert for new and returning users. Optional profile fields only
+        # overwrite stored values when Spotify sent them.
+        display_name = profile.get("display_name")
+        email = profile.get("email")
+        country = profile.get("country")
+        product = profile.get("product")
+        stmt = _upsert_insert(session, models.User).values(
+            id=models.uuid7(),
             spotify_id=spotify_id,
-            display_name=profile.get("display_name") or spotify_id,
+            display_name=display_name or spotify_id,
             avatar_url=avatar_url,
-            email=profile.get("email"),
-            country=profile.get("country"),
-            product=profile.get("product"),
+            email=email,
+            country=country,
+            product=product,
             access_token=access_token,
             refresh_token=refresh_token or "",
             token_expires_at=expires_at,
             scope=scope,
             preferences={},
         )
-        session.add(user)
-    else:
-        user.display_name = profile.get("display_name") or user.display_name
-        user.avatar_url = avatar_url or user.avatar_url
-        user.email = profile.get("email") or user.email
-        user.country = profile.get("country") or user.country
-        user.product = profile.get("product") or user.product
-        user.access_token = access_token
-        if refresh_token:
-            user.refresh_token = refresh_token
-        user.token_expires_at = expires_at
-        user.scope = scope or user.scope
-
-    session.commit()
+        updates = {
+            "access_token": access_token,
+            "token_expires_at": expires_at,
+            # ON CONFLICT DO UPDATE skips column onupdate hooks.
+            "updated_at": models.utc_now(),
+        }
+        for column, value in (
+            ("display_name", display_name),
+            ("avatar_url", avatar_url),
+            ("email", email),
+            ("country", country),
+            ("product", product),
+            ("refresh_token", refresh_token),
+            ("scope", scope),
+        ):
+            if value:
+                updates[column] = value
+        user = (
+            await session.execute(
+                stmt.on_conflict_do_update(index_elements=[models.User.spotify_id], set_=updates).returning(
+                    models.User.id, models.User.refresh_token
+                )
+            )
+        ).one()
+        if not user.refresh_token:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Missing refresh token")
 
+    spotify_token_cache.pop(user.id)
     session_token = create_session_token(user.id)
-    logger.info("Spotify login success for user %s; redirecting to %s", user.spotify_id, redirect_target)
+    logger.info("Spotify login success for user %s; redirecting to %s", spotify_id, redirect_target)
     redirect_response = RedirectResponse(url=redirect_target, status_code=status.HTTP_303_SEE_OTHER)
     set_session_cookie(redirect_response, session_token, request=request)
     return redirect_response
@@ -187,6 +250,9 @@ async def spotify_callback(
 
 @router.post("/logout", status_code=status.HTTP_204_NO_CONTENT, response_class=Response)
 def logout(request: Request) -> Response:
+    session_token = request.cookies.get(SESSION_COOKIE_NAME)
+    if session_token:
+        session_user_cache.pop(session_token)
     response = Response(status_code=status.HTTP_204_NO_CONTENT)
     clear_session_cookie(response, request=request)
     logger.info("User logged out")
@@ -1,11 +1,13 @@
 ﻿from datetime import datetime
 
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, aliased
 
 from .. import models, schemas
 from ..database import get_session
+from .common import ensure_exists, json_list_response
 
 
 router = APIRouter(prefix="/rooms", tags=["chat"])
@@ -18,21 +20,22 @@ def list_messages(
     limit: int = Query(default=50, ge=1, le=200),
     session: Session = Depends(get_session),
 ):
-    room = session.get(models.Room, room_id)
-    if not room:
-        raise HTTPException(status_code=404, detail="Room not found")
+    ensure_exists(session, models.Room, room_id, "Room not found")
 
-    stmt = (
+    latest = (
         select(models.ChatMessage)
         .where(models.ChatMessage.room_id == room_id)
-        .order_by(models.ChatMessage.created_at.desc())
+        .order_by(models.ChatMessage.created_at.desc(), models.ChatMessage.id.desc())
         .limit(limit)
     )
     if since:
-        stmt = stmt.where(models.ChatMessage.created_at >= since)
+        latest = latest.where(models.ChatMessage.created_at >= since)
 
-    messages = session.scalars(stmt)
-    return list(reversed(list(messages)))
+    # Take the newest page in SQL, then let SQL return it oldest-first.
+    latest = latest.subquery()
+    message = aliased(models.ChatMessage, latest)
+    stmt = select(message).order_by(latest.c.created_at, latest.c.id)
+    return json_list_response(schemas.CHAT_MESSAGE_LIST_ADAPTER, session.scalars(stmt).all())
 
 
 @router.post(
@@ -45,18 +48,19 @@ def post_message(
     payload: schemas.ChatMessageCreate,
     session: Session = Depends(get_session),
 ):
-    room = session.get(models.Room, room_id)
-    if not room:
-        raise HTTPException(status_code=404, detail="Room not found")
-
-    user = session.get(models.User, payload.user_id)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
+    # The foreign keys check room and user inside the INSERT; the lookups that
+    # pick the right 404 only run when it fails.
     message = models.ChatMessage(room_id=room_id, **payload.model_dump())
     session.add(message)
-    session.commit()
-    session.refresh(message)
+    try:
+        session.commit()
+    except IntegrityError:
+        session.rollback()
+        if session.get(models.Room, room_id) is None:
+            raise HTTPException(status_code=404, detail="Room not found")
+        if session.get(models.User, payload.user_id) is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        raise
     return message
 
 
@@ -66,18 +70,10 @@ def post_message(
     status_code=201,
 )
 def react_to_message(
-    message_id: str,
+    message_id: int,
     payload: schemas.ReactionCreate,
     session: Session = Depends(get_session),
 ):
-    message = session.get(models.ChatMessage, message_id)
-    if not message:
-        raise HTTPException(status_code=404, detail="Message not found")
-
-    user = session.get(models.User, payload.user_id)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
     reaction = models.Reaction(
         message_id=message_id,
         user_id=payload.user_id,
@@ -87,17 +83,23 @@ def react_to_message(
     session.add(reaction)
     try:
         session.commit()
-    except Exception:
+    except IntegrityError:
         session.rollback()
+        if session.get(models.ChatMessage, message_id) is None:
+            raise HTTPException(status_code=404, detail="Message not found")
+        if session.get(models.User, payload.user_id) is None:
+            raise HTTPException(status_code=404, detail="User not found")
         raise HTTPException(status_code=409, detail="Reaction already exists")
-    session.refresh(reaction)
     return reaction
 
 
 @router.delete("/reactions/{reaction_id}", status_code=204)
-def delete_reaction(reaction_id: str, session: Session = Depends(get_session)):
-    reaction = session.get(models.Reaction, reaction_id)
-    if not reaction:
-        raise HTTPException(status_code=404, detail="Reaction not found")
-    session.delete(reaction)
+def delete_reaction(reaction_id: int, session: Session = Depends(get_session)):
+    result = session.execute(
+        delete(models.Reaction)
+        .where(models.Reaction.id == reaction_id)
+        .execution_options(synchronize_session=False)
+    )
     session.commit()
+    if result.rowcount == 0:
+        raise HTTPException(status_code=404, detail="Reaction not found")
@@ -0,0 +1,39 @@
+﻿from datetime import datetime, timezone
+
+from fastapi import HTTPException, Response
+from pydantic import BaseModel, TypeAdapter
+from sqlalchemy import exists, select
+from sqlalchemy.orm import Session
+
+
+def ensure_exists(session: Session, model, entity_id, detail: str) -> None:
+    """Raise 404 unless a ``model`` row with ``entity_id`` exists, without loading the row."""
+
+    if not session.scalar(select(exists().where(model.id == entity_id))):
+        raise HTTPException(status_code=404, detail=detail)
+
+
+def json_response(payload: BaseModel, status_code: int = 200) -> Response:
+    """Serialise an already-validated model with pydantic-core, bypassing response_model re-validation."""
+
+    return Response(
+        content=payload.model_dump_json(),
+        status_code=status_code,
+        media_type="application/json",
+    )
+
+
+def json_list_response(adapter: TypeAdapter, rows, headers: dict[str, str] | None = None) -> Response:
+    """Validate ORM rows with a prebuilt list adapter and dump them to JSON in one pydantic-core pass."""
+
+    return Response(
+        content=adapter.dump_json(adapter.validate_python(rows, from_attributes=True)),
+        media_type="application/json",
+        headers=headers,
+    )
+
+
+def now_utc() -> datetime:
+    """Request-scoped current time (timezone-aware UTC); inject with ``Depends(now_utc)``."""
+
+    return datetime.now(timezone.utc)
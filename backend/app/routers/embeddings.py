@@ -22,6 +22,7 @@ def upsert_embedding(
     )
     if embedding:
         embedding.vector = payload.vector
+        embedding.norm = models.embedding_norm(payload.vector)
         embedding.model_version = payload.model_version
         embedding.dimensionality = len(payload.vector)
     else:
@@ -29,6 +30,7 @@ def upsert_embedding(
             entity_type=payload.entity_type,
             entity_id=payload.entity_id,
             vector=payload.vector,
+            norm=models.embedding_norm(payload.vector),
             model_version=payload.model_version,
             dimensionality=len(payload.vector),
         )
@@ -25,6 +25,5 @@ def create_log(
 
 @router.get("/logs", response_model=list[schemas.ModerationLogRead])
 def list_logs(session: Session = Depends(get_session)):
-    logs = session.scalars(select(models.ModerationLog).order_by(models.ModerationLog.created_at.desc()))
-    return list(logs)
+    return session.scalars(select(models.ModerationLog).order_by(models.ModerationLog.created_at.desc())).all()
 
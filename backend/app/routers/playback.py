@@ -5,7 +5,7 @@ from sqlalchemy.orm import Session
 
 from .. import models, schemas
 from ..database import get_session
-from ..services.playback import upsert_playback_state
+from ..services.playback import get_room_with_playback, upsert_playback_state
 
 
 router = APIRouter(prefix="/rooms", tags=["playback"])
@@ -13,7 +13,7 @@ router = APIRouter(prefix="/rooms", tags=["playback"])
 
 @router.get("/{room_id}/playback", response_model=schemas.PlaybackStateRead)
 def get_playback(room_id: str, session: Session = Depends(get_session)):
-    room = session.get(models.Room, room_id)
+    room = get_room_with_playback(session, room_id)
     if not room:
         raise HTTPException(status_code=404, detail="Room not found")
     if not room.playback_state:
@@ -27,7 +27,7 @@ def set_playback(
     payload: schemas.PlaybackStateUpdate,
     session: Session = Depends(get_session),
 ):
-    room = session.get(models.Room, room_id)
+    room = get_room_with_playback(session, room_id)
     if not room:
         raise HTTPException(status_code=404, detail="Room not found")
 
@@ -45,7 +45,5 @@ def set_playback(
         listeners=payload.listeners,
     )
     room.live_track_id = track.id
-    session.add(room)
     session.commit()
-    session.refresh(state)
     return state
@@ -1,11 +1,14 @@
 ﻿from datetime import datetime
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from .. import models, schemas
 from ..database import get_session
+from .common import ensure_exists, now_utc
 from ..services.recommendation import generate_room_recommendations
 
 
@@ -33,6 +36,13 @@ def fetch_recommendations(
         include_recent=include_recent,
     )
 
+    # The scored items go to JSON as plain dicts; schemas.RecommendationResponse
+    # only documents the shape, so no pydantic model is built per item.
+    ranked_list = [
+        {"track_id": item.track_id, "score": item.score, "breakdown": item.breakdown}
+        for item in items
+    ]
+
     event = models.RecommendationEvent(
         room_id=room.id,
         input_context={
@@ -42,29 +52,24 @@ def fetch_recommendations(
             "user_count": context.user_count,
             "reaction_count": context.reaction_count,
         },
-        ranked_list=[
-            {"track_id": item.track_id, "score": item.score, "breakdown": item.breakdown}
-            for item in items
-        ],
+        ranked_list=ranked_list,
     )
     session.add(event)
+    # expire_on_commit is off, so the id assigned at flush stays loaded.
     session.commit()
-    session.refresh(event)
-
-    response_items = [
-        schemas.RecommendationItem(
-            track_id=item.track_id,
-            score=item.score,
-            breakdown=item.breakdown,
-        )
-        for item in items
-    ]
 
-    return schemas.RecommendationResponse(
-        room_id=room.id,
-        generated_at=context.generated_at,
-        event_id=event.id,
-        items=response_items,
+    return Response(
+        content=orjson.dumps(
+            {
+                "room_id": room.id,
+                "generated_at": context.generated_at,
+                "event_id": event.id,
+                "items": ranked_list,
+            },
+            # Match pydantic's "Z" suffix for UTC timestamps.
+            option=orjson.OPT_UTC_Z,
+        ),
+        media_type="application/json",
     )
 
 
@@ -76,10 +81,9 @@ def accept_recommendation(
     room_id: str,
     payload: schemas.RecommendationAccept,
     session: Session = Depends(get_session),
+    now: datetime = Depends(now_utc),
 ):
-    room = session.get(models.Room, room_id)
-    if not room:
-        raise HTTPException(status_code=404, detail="Room not found")
+    ensure_exists(session, models.Room, room_id, "Room not found")
 
     event = None
     if payload.event_id:
@@ -93,15 +97,18 @@ def accept_recommendation(
     if event is None:
         raise HTTPException(status_code=404, detail="Recommendation event not found")
 
-    chosen_track = session.get(models.Track, payload.track_id)
-    if not chosen_track:
-        raise HTTPException(status_code=404, detail="Track not found")
-
     event.chosen_track_id = payload.track_id
     context = dict(event.input_context or {})
     context["accepted_source"] = payload.source
-    context["accepted_at"] = context.get("accepted_at") or datetime.utcnow().isoformat()
+    context["accepted_at"] = context.get("accepted_at") or now.isoformat()
     event.input_context = context
 
-    session.add(event)
-    session.commit()
+    try:
+        session.commit()
+    except IntegrityError:
+        # chosen_track_id's foreign key stands in for a separate track lookup;
+        # only check for the track once the write has failed.
+        session.rollback()
+        if session.get(models.Track, payload.track_id) is None:
+            raise HTTPException(status_code=404, detail="Track not found")
+        raise
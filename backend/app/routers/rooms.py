@@ -1,12 +1,16 @@
 ﻿from datetime import datetime
+import time
 
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import func, select
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, selectinload
 
 from .. import models, schemas
 from ..database import get_session
+from .common import ensure_exists, json_list_response, now_utc
 from ..services.playback import (
+    get_room_with_playback,
     pause_room_playback,
     resume_room_playback,
     update_room_listener_count,
@@ -15,6 +19,8 @@ from ..services.playback import (
 
 router = APIRouter(prefix="/rooms", tags=["rooms"])
 
+ENQUEUE_ATTEMPTS = 3
+
 
 @router.post("", response_model=schemas.RoomRead, status_code=201)
 def create_room(payload: schemas.RoomCreate, session: Session = Depends(get_session)):
@@ -22,10 +28,10 @@ def create_room(payload: schemas.RoomCreate, session: Session = Depends(get_sess
     if not artist:
         raise HTTPException(status_code=404, detail="Artist not found")
 
-    room = models.Room(**payload.model_dump())
+    # A new room has no playback state; saying so up front keeps RoomRead from lazy-loading it.
+    room = models.Room(**payload.model_dump(), playback_state=None)
     session.add(room)
     session.commit()
-    session.refresh(room)
     return room
 
 
@@ -36,7 +42,11 @@ def list_rooms(
     featured: bool | None = Query(default=None),
     session: Session = Depends(get_session),
 ):
-    stmt = select(models.Room)
+    # RoomRead nests playback_state.track: one extra SELECT for every listed room's
+    # state (with its track joined) instead of two lazy loads per room.
+    stmt = select(models.Room).options(
+        selectinload(models.Room.playback_state).joinedload(models.PlaybackState.track)
+    )
     if artist_id:
         stmt = stmt.where(models.Room.artist_id == artist_id)
     if mode:
@@ -44,13 +54,12 @@ def list_rooms(
     if featured is not None:
         stmt = stmt.where(models.Room.is_featured.is_(featured))
     stmt = stmt.order_by(models.Room.created_at.desc())
-    rooms = session.scalars(stmt)
-    return list(rooms)
+    return json_list_response(schemas.ROOM_LIST_ADAPTER, session.scalars(stmt).all())
 
 
 @router.get("/{room_id}", response_model=schemas.RoomRead)
 def get_room(room_id: str, session: Session = Depends(get_session)):
-    room = session.get(models.Room, room_id)
+    room = get_room_with_playback(session, room_id)
     if not room:
         raise HTTPException(status_code=404, detail="Room not found")
     return room
@@ -60,7 +69,7 @@ def get_room(room_id: str, session: Session = Depends(get_session)):
 def update_room(
     room_id: str, payload: schemas.RoomUpdate, session: Session = Depends(get_session)
 ):
-    room = session.get(models.Room, room_id)
+    room = get_room_with_playback(session, room_id)
     if not room:
         raise HTTPException(status_code=404, detail="Room not found")
 
@@ -68,9 +77,8 @@ def update_room(
     for key, value in data.items():
         setattr(room, key, value)
 
-    session.add(room)
+    # eager_defaults brings updated_at back with the UPDATE, so no refresh is needed.
     session.commit()
-    session.refresh(room)
     return room
 
 
@@ -79,21 +87,17 @@ def join_room(
     room_id: str,
     payload: schemas.RoomJoinRequest,
     session: Session = Depends(get_session),
+    now: datetime = Depends(now_utc),
 ):
-    room = session.get(models.Room, room_id)
+    room = get_room_with_playback(session, room_id)
     if not room:
         raise HTTPException(status_code=404, detail="Room not found")
 
-    user = session.get(models.User, payload.user_id)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    membership = session.scalar(
-        select(models.RoomMembership).where(
-            models.RoomMembership.room_id == room_id,
-            models.RoomMembership.user_id == payload.user_id,
-        )
+    membership_stmt = select(models.RoomMembership).where(
+        models.RoomMembership.room_id == room_id,
+        models.RoomMembership.user_id == payload.user_id,
     )
+    membership = session.scalar(membership_stmt)
 
     if membership:
         membership.left_at = None
@@ -103,16 +107,28 @@ def join_room(
             room_id=room_id,
             user_id=payload.user_id,
             role=payload.role,
-            joined_at=datetime.utcnow(),
+            joined_at=now,
         )
-
-    session.add(membership)
-    session.flush()
+        session.add(membership)
+
+    try:
+        # autoflush is off, so flush explicitly before counting active listeners.
+        session.flush()
+    except IntegrityError:
+        session.rollback()
+        if session.get(models.Room, room_id) is None:
+            raise HTTPException(status_code=404, detail="Room not found")
+        if session.get(models.User, payload.user_id) is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        # A concurrent join committed the same (room, user) membership first; hand it back.
+        existing = session.scalar(membership_stmt)
+        if existing is None:
+            raise
+        return existing
     listeners = update_room_listener_count(session, room)
     if listeners > 0:
         resume_room_playback(session, room, listeners)
     session.commit()
-    session.refresh(membership)
     return membership
 
 
@@ -121,8 +137,9 @@ def leave_room(
     room_id: str,
     payload: schemas.RoomLeaveRequest,
     session: Session = Depends(get_session),
+    now: datetime = Depends(now_utc),
 ):
-    room = session.get(models.Room, room_id)
+    room = get_room_with_playback(session, room_id)
     if not room:
         raise HTTPException(status_code=404, detail="Room not found")
     membership = session.scalar(
@@ -134,8 +151,7 @@ def leave_room(
     if not membership:
         raise HTTPException(status_code=404, detail="Membership not found")
 
-    membership.left_at = datetime.utcnow()
-    session.add(membership)
+    membership.left_at = now
     session.flush()
     listeners = update_room_listener_count(session, room)
     if listeners == 0:
@@ -143,22 +159,18 @@ def leave_room(
     else:
         resume_room_playback(session, room, listeners)
     session.commit()
-    session.refresh(membership)
     return membership
 
 
 @router.get("/{room_id}/queue", response_model=list[schemas.QueueEntryRead])
 def get_queue(room_id: str, session: Session = Depends(get_session)):
-    room = session.get(models.Room, room_id)
-    if not room:
-        raise HTTPException(status_code=404, detail="Room not found")
+    ensure_exists(session, models.Room, room_id, "Room not found")
 
-    entries = session.scalars(
+    return session.scalars(
         select(models.QueueEntry)
         .where(models.QueueEntry.room_id == room_id)
         .order_by(models.QueueEntry.position)
-    )
-    return list(entries)
+    ).all()
 
 
 @router.post(
@@ -171,52 +183,70 @@ def enqueue_track(
     payload: schemas.QueueEntryCreate,
     session: Session = Depends(get_session),
 ):
-    room = session.get(models.Room, room_id)
-    if not room:
-        raise HTTPException(status_code=404, detail="Room not found")
-
-    track = session.get(models.Track, payload.track_id)
-    if not track:
-        raise HTTPException(status_code=404, detail="Track not found")
-
-    last_position = session.scalar(
-        select(func.max(models.QueueEntry.position)).where(
-            models.QueueEntry.room_id == room_id
-        )
+    # One INSERT computes the next position and lets the foreign keys check room
+    # and track. SQLite runs it under the write lock, so positions cannot collide;
+    # the retry only covers backends whose isolation lets two MAX() reads race.
+    next_position = (
+        select(func.coalesce(func.max(models.QueueEntry.position), 0) + 1)
+        .where(models.QueueEntry.room_id == room_id)
+        .scalar_subquery()
     )
-    next_position = (last_position or 0) + 1
-
-    entry = models.QueueEntry(
-        room_id=room_id,
-        track_id=payload.track_id,
-        position=next_position,
-        note=payload.note,
+    stmt = (
+        insert(models.QueueEntry)
+        .values(
+            room_id=room_id,
+            track_id=payload.track_id,
+            position=next_position,
+            note=payload.note,
+        )
+        .returning(models.QueueEntry)
     )
-
-    session.add(entry)
-    session.commit()
-    session.refresh(entry)
-    return entry
+    for attempt in range(ENQUEUE_ATTEMPTS):
+        try:
+            entry = session.scalar(stmt)
+            session.commit()
+            return entry
+        except IntegrityError:
+            session.rollback()
+            if session.get(models.Room, room_id) is None:
+                raise HTTPException(status_code=404, detail="Room not found")
+            if session.get(models.Track, payload.track_id) is None:
+                raise HTTPException(status_code=404, detail="Track not found")
+            if attempt == ENQUEUE_ATTEMPTS - 1:
+                raise HTTPException(status_code=409, detail="Queue is busy, please retry")
+            # Another enqueue took the same position; back off and recompute it.
+            time.sleep(0.01 * 2**attempt)
 
 
 @router.delete("/queue/{entry_id}", status_code=204)
-def delete_queue_entry(entry_id: str, session: Session = Depends(get_session)):
-    entry = session.get(models.QueueEntry, entry_id)
-    if not entry:
-        raise HTTPException(status_code=404, detail="Queue entry not found")
-    session.delete(entry)
+def delete_queue_entry(entry_id: int, session: Session = Depends(get_session)):
+    result = session.execute(
+        delete(models.QueueEntry)
+        .where(models.QueueEntry.id == entry_id)
+        .execution_options(synchronize_session=False)
+    )
     session.commit()
+    if result.rowcount == 0:
+        raise HTTPException(status_code=404, detail="Queue entry not found")
 
 
 @router.post("/{room_id}/queue/pop", response_model=schemas.QueueEntryRead)
 def pop_next_queue(room_id: str, session: Session = Depends(get_session)):
-    entry = session.scalar(
-        select(models.QueueEntry)
+    # Pick and remove the head of the queue in one DELETE ... RETURNING.
+    head = (
+        select(models.QueueEntry.id)
         .where(models.QueueEntry.room_id == room_id)
         .order_by(models.QueueEntry.position)
+        .limit(1)
+        .scalar_subquery()
+    )
+    entry = session.scalar(
+        delete(models.QueueEntry)
+        .where(models.QueueEntry.id == head)
+        .returning(models.QueueEntry)
+        .execution_options(synchronize_session=False)
     )
     if not entry:
         raise HTTPException(status_code=404, detail="Queue is empty")
-    session.delete(entry)
     session.commit()
     return entry
@@ -1,28 +1,70 @@
 ﻿from __future__ import annotations
 
-from fastapi import APIRouter, Depends, HTTPException
+import threading
+import time
+
+from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 
 from .. import models, schemas
 from ..database import get_session
-from ..security import get_current_user
+from ..security import get_current_user_id
 from ..services.spotify_oauth import (
     SpotifyTokenRefreshError,
     ensure_valid_access_token,
 )
+from ..utils.cache import spotify_token_cache
 
 router = APIRouter(prefix="/spotify", tags=["spotify"])
 
+# ensure_valid_access_token refreshes tokens with less than this many seconds left,
+# so cached tokens must drop out before reaching that point.
+TOKEN_REFRESH_MARGIN_SECONDS = 120
+
+# Striped locks so concurrent cache misses for one user share a single refresh
+# instead of each calling Spotify; a fixed stripe count keeps memory bounded.
+_REFRESH_LOCKS = tuple(threading.Lock() for _ in range(64))
+
+
+def _cached_playback_token(user_id: str) -> schemas.SpotifyPlaybackToken | None:
+    cached = spotify_token_cache.get(user_id)
+    if cached is None:
+        return None
+    access_token, expires_at = cached
+    return schemas.SpotifyPlaybackToken(
+        access_token=access_token, expires_in=max(int(expires_at - time.time()), 0)
+    )
+
 
 @router.get("/playback-token", response_model=schemas.SpotifyPlaybackToken)
 def playback_token(
     session: Session = Depends(get_session),
-    user: models.User = Depends(get_current_user),
+    user_id: str = Depends(get_current_user_id),
 ) -> schemas.SpotifyPlaybackToken:
-    try:
-        access_token, expires_in = ensure_valid_access_token(session, user)
-        session.commit()
-    except SpotifyTokenRefreshError as exc:
-        session.rollback()
-        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    token = _cached_playback_token(user_id)
+    if token is not None:
+        return token
+
+    with _REFRESH_LOCKS[hash(user_id) % len(_REFRESH_LOCKS)]:
+        # Another request may have refreshed and cached the token while we waited.
+        token = _cached_playback_token(user_id)
+        if token is not None:
+            return token
+
+        user = session.get(models.User, user_id)
+        if not user:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
+        previous_token = user.access_token
+        try:
+            access_token, expires_in = ensure_valid_access_token(session, user)
+            # Only a refresh changes anything worth persisting.
+            if access_token != previous_token:
+                session.commit()
+        except SpotifyTokenRefreshError as exc:
+            session.rollback()
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+        ttl = expires_in - TOKEN_REFRESH_MARGIN_SECONDS
+        if ttl > 0:
+            spotify_token_cache.set(user_id, (access_token, time.time() + expires_in), ttl=ttl)
     return schemas.SpotifyPlaybackToken(access_token=access_token, expires_in=expires_in)
@@ -4,6 +4,7 @@ from sqlalchemy.orm import Session
 
 from .. import models, schemas
 from ..database import get_session
+from .common import json_list_response
 
 
 router = APIRouter(prefix="/tracks", tags=["tracks"])
@@ -23,8 +24,7 @@ def list_tracks(
     if artist_id:
         stmt = stmt.where(models.Track.artist_id == artist_id)
     stmt = stmt.order_by(models.Track.popularity.desc(), models.Track.created_at.desc())
-    tracks = session.scalars(stmt)
-    return list(tracks)
+    return json_list_response(schemas.TRACK_LIST_ADAPTER, session.scalars(stmt).all())
 
 
 @router.get("/{track_id}", response_model=schemas.TrackRead)
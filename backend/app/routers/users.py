@@ -4,7 +4,7 @@ from sqlalchemy.orm import Session
 
 from .. import models, schemas
 from ..database import get_session
-from ..security import get_current_user
+from ..security import get_current_user, get_current_user_id
 
 
 router = APIRouter(prefix="/users", tags=["users"])
@@ -18,17 +18,16 @@ def read_current_user(current_user: models.User = Depends(get_current_user)):
 @router.get("", response_model=list[schemas.UserRead])
 def list_users(
     session: Session = Depends(get_session),
-    _: models.User = Depends(get_current_user),
+    _: str = Depends(get_current_user_id),
 ):
-    users = session.scalars(select(models.User).order_by(models.User.created_at.desc()))
-    return list(users)
+    return session.scalars(select(models.User).order_by(models.User.created_at.desc())).all()
 
 
 @router.get("/{user_id}", response_model=schemas.UserRead)
 def get_user(
     user_id: str,
     session: Session = Depends(get_session),
-    _: models.User = Depends(get_current_user),
+    _: str = Depends(get_current_user_id),
 ):
     user = session.get(models.User, user_id)
     if not user:
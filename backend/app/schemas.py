@@ -3,7 +3,7 @@
 from datetime import datetime
 from typing import Any, Dict, List, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, TypeAdapter
 
 from .models import (
     EntityKind,
@@ -62,7 +62,7 @@ class ArtistRead(Timestamped):
     followers: int
     popularity: int
     spotify_url: Optional[str]
-    metadata: Dict[str, Any] = Field(alias="metadata_json")
+    metadata: Dict[str, Any] = Field(validation_alias="metadata_json")
     official_flag: bool
 
 
@@ -134,7 +134,7 @@ class RoomRead(Timestamped):
     description: Optional[str]
     mode: RoomMode
     rules: Dict[str, Any]
-    pinned_message_ids: List[str]
+    pinned_message_ids: List[int]
     live_track_id: Optional[str]
     is_featured: bool
     focus_level: Optional[int]
@@ -147,7 +147,7 @@ class QueueEntryCreate(BaseModel):
 
 
 class QueueEntryRead(Timestamped):
-    id: str
+    id: int
     room_id: str
     track_id: str
     position: int
@@ -194,7 +194,7 @@ class ChatMessageCreate(BaseModel):
 
 
 class ChatMessageRead(Timestamped):
-    id: str
+    id: int
     room_id: str
     user_id: str
     body: str
@@ -210,8 +210,8 @@ class ReactionCreate(BaseModel):
 
 
 class ReactionRead(Timestamped):
-    id: str
-    message_id: str
+    id: int
+    message_id: int
     user_id: str
     type: ReactionType
 
@@ -247,12 +247,13 @@ class RecommendationItem(BaseModel):
 class RecommendationResponse(BaseModel):
     room_id: str
     generated_at: datetime
-    event_id: str
+    event_id: int
     items: List[RecommendationItem]
 
 
 class RecommendationAccept(BaseModel):
     track_id: str
+    event_id: Optional[int] = None
     source: str = Field("manual")
 
 
@@ -266,7 +267,7 @@ class ModerationLogCreate(BaseModel):
 
 
 class ModerationLogRead(Timestamped):
-    id: str
+    id: int
     entity_type: EntityKind
     entity_id: str
     action: ModerationAction
@@ -283,7 +284,7 @@ class EmbeddingCreate(BaseModel):
 
 
 class EmbeddingRead(Timestamped):
-    id: str
+    id: int
     entity_type: EntityKind
     entity_id: str
     vector: List[float]
@@ -306,3 +307,10 @@ class RoomLeaveRequest(BaseModel):
 
 class SpotifyLoginResponse(BaseModel):
     auth_url: str
+
+
+# Built once at import for list endpoints that serialise ORM rows straight to JSON bytes.
+ARTIST_LIST_ADAPTER = TypeAdapter(List[ArtistRead])
+TRACK_LIST_ADAPTER = TypeAdapter(List[TrackRead])
+CHAT_MESSAGE_LIST_ADAPTER = TypeAdapter(List[ChatMessageRead])
+ROOM_LIST_ADAPTER = TypeAdapter(List[RoomRead])
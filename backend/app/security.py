@@ -1,6 +1,8 @@
 from __future__ import annotations
 
 import os
+from datetime import datetime, timezone
+from functools import lru_cache
 from typing import Optional
 
 from fastapi import Cookie, Depends, HTTPException, Request, status
@@ -9,6 +11,7 @@ from sqlalchemy.orm import Session
 
 from . import models
 from .database import get_session
+from .utils.cache import session_user_cache
 
 SESSION_COOKIE_NAME = os.getenv("SESSION_COOKIE_NAME", "looproom_session")
 SESSION_MAX_AGE = int(os.getenv("SESSION_MAX_AGE", "2592000"))  # 30 days default
@@ -26,6 +29,12 @@ def _serializer() -> URLSafeTimedSerializer:
     secret = os.getenv("APP_SECRET")
     if not secret:
         raise RuntimeError("APP_SECRET environment variable is required for session management")
+    return _serializer_for(secret)
+
+
+@lru_cache(maxsize=1)
+def _serializer_for(secret: str) -> URLSafeTimedSerializer:
+    # Keyed on the secret so rotating APP_SECRET still takes effect without a restart.
     return URLSafeTimedSerializer(secret_key=secret, salt="looproom.session")
 
 
@@ -55,9 +64,11 @@ def create_session_token(user_id: str) -> str:
     return _serializer().dumps({"sub": user_id})
 
 
-def verify_session_token(token: str) -> str:
+def _load_session_token(token: str) -> tuple[str, float]:
+    """Verify ``token`` and return its user id with the seconds left before it expires."""
+
     try:
-        data = _serializer().loads(token, max_age=SESSION_MAX_AGE)
+        data, signed_at = _serializer().loads(token, max_age=SESSION_MAX_AGE, return_timestamp=True)
     except SignatureExpired as exc:  # pragma: no cover - fast fail
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Session expired") from exc
     except BadSignature as exc:  # pragma: no cover - fast fail
@@ -66,7 +77,12 @@ def verify_session_token(token: str) -> str:
     user_id = data.get("sub")
     if not user_id:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid session payload")
-    return user_id
+    remaining = SESSION_MAX_AGE - (datetime.now(timezone.utc) - signed_at).total_seconds()
+    return user_id, remaining
+
+
+def verify_session_token(token: str) -> str:
+    return _load_session_token(token)[0]
 
 
 def set_session_cookie(response, token: str, request: Request | None = None) -> None:
@@ -106,11 +122,27 @@ def get_session_token(session_token: Optional[str] = Cookie(default=None, alias=
     return session_token
 
 
-def get_current_user(
+def get_current_user_id(
     session: Session = Depends(get_session),
     session_token: str = Depends(get_session_token),
+) -> str:
+    """Authenticate the request without loading the user row when the session was seen recently."""
+
+    user_id = session_user_cache.get(session_token)
+    if user_id is not None:
+        return user_id
+    user_id, remaining = _load_session_token(session_token)
+    if session.get(models.User, user_id) is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
+    # Never trust a cached session past the token's own max_age.
+    session_user_cache.set(session_token, user_id, ttl=min(session_user_cache.ttl, remaining))
+    return user_id
+
+
+def get_current_user(
+    session: Session = Depends(get_session),
+    user_id: str = Depends(get_current_user_id),
 ) -> models.User:
-    user_id = verify_session_token(session_token)
     user = session.get(models.User, user_id)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
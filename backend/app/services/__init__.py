@@ -1,3 +1,3 @@
 ﻿from .spotify_sync import SpotifyCatalogSync, SpotifySyncError, SyncStats  # noqa: F401
 
-from .spotify_oauth import SpotifyTokenRefreshError, ensure_valid_access_token  # noqa: F401\r\n
+from .spotify_oauth import SpotifyTokenRefreshError, close_token_client, ensure_valid_access_token  # noqa: F401\r\n
@@ -3,12 +3,22 @@
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 
-from sqlalchemy import select, func
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session, joinedload
 
 from .. import models
 
 
+def get_room_with_playback(session: Session, room_id: str) -> Optional[models.Room]:
+    """Load a room together with its playback state and current track in one query."""
+
+    return session.get(
+        models.Room,
+        room_id,
+        options=[joinedload(models.Room.playback_state).joinedload(models.PlaybackState.track)],
+    )
+
+
 def upsert_playback_state(
     session: Session,
     room: models.Room,
@@ -20,16 +30,21 @@ def upsert_playback_state(
 ) -> models.PlaybackState:
     """Create or update the playback state for a room."""
 
-    now = datetime.utcnow()
+    now = datetime.now(timezone.utc)
     start = start_ts or now
     state = room.playback_state
-    previous_track_id = state.track_id if state else None
+    # Read the relationship, not track_id: without a flush the foreign key still
+    # holds whatever was last written, not a track assigned earlier in this unit of work.
+    previous_track = state.track if state else None
+    previous_track_id = previous_track.id if previous_track else None
     track_changed = previous_track_id != track.id
 
     if state is None:
+        # Assign the relationships, not just the keys, so room.playback_state and
+        # state.track are current without a reload.
         state = models.PlaybackState(
-            room_id=room.id,
-            track_id=track.id,
+            room=room,
+            track=track,
             start_ts=start,
             anchor_server_ts=now,
             offset_ms=offset_ms,
@@ -38,7 +53,7 @@ def upsert_playback_state(
         )
         session.add(state)
     else:
-        state.track_id = track.id
+        state.track = track
         state.start_ts = start
         state.offset_ms = offset_ms
         state.is_paused = is_paused
@@ -56,24 +71,35 @@ def upsert_playback_state(
     else:
         track.last_played_at = track.last_played_at or now
 
-    session.add(track)
-    session.flush()
-
+    # No flush: state.id comes from a client-side default, and every caller
+    # commits right after, so the INSERT/UPDATEs go out with the rest of the unit of work.
     return state
 
 
 def _close_active_history(
     session: Session, room_id: str, track_id: str, ended_at: datetime
 ) -> None:
-    history = session.scalar(
-        select(models.RoomTrackHistory)
+    # Nothing is flushed before the caller commits, so a row opened earlier in
+    # this unit of work is still pending and invisible to the UPDATE below.
+    for entry in session.new:
+        if (
+            isinstance(entry, models.RoomTrackHistory)
+            and entry.room_id == room_id
+            and entry.track_id == track_id
+            and entry.ended_at is None
+        ):
+            entry.ended_at = ended_at
+
+    # A single UPDATE on the partial ix_room_track_history_open index instead of
+    # loading the latest row first.
+    session.execute(
+        update(models.RoomTrackHistory)
         .where(models.RoomTrackHistory.room_id == room_id)
         .where(models.RoomTrackHistory.track_id == track_id)
-        .order_by(models.RoomTrackHistory.played_at.desc())
+        .where(models.RoomTrackHistory.ended_at.is_(None))
+        .values(ended_at=ended_at)
+        .execution_options(synchronize_session=False)
     )
-    if history and history.ended_at is None:
-        history.ended_at = ended_at
-        session.add(history)
 
 
 def _create_history(session: Session, room_id: str, track_id: str, played_at: datetime) -> None:
@@ -96,7 +122,6 @@ def update_room_listener_count(session: Session, room: models.Room) -> int:
 
     if room.playback_state:
         room.playback_state.listeners = active_count
-        session.add(room.playback_state)
 
     return active_count
 
@@ -112,7 +137,6 @@ def resume_room_playback(session: Session, room: models.Room, listeners: int | N
         state.listeners = listeners
 
     if not state.is_paused:
-        session.add(state)
         return
 
     offset = state.offset_ms or 0
@@ -140,7 +164,6 @@ def pause_room_playback(session: Session, room: models.Room, listeners: int | No
     if state.is_paused:
         if listeners is not None and listeners != state.listeners:
             state.listeners = listeners
-            session.add(state)
         return
 
     now = datetime.now(timezone.utc)
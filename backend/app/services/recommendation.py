@@ -1,8 +1,10 @@
 ﻿from __future__ import annotations
 
+import heapq
 import math
+import operator
 from dataclasses import dataclass
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Optional
 
 from sqlalchemy import func, select
@@ -11,14 +13,16 @@ from sqlalchemy.orm import Session
 from .. import models
 
 
-@dataclass
+# Not frozen: frozen dataclasses assign through object.__setattr__, roughly doubling
+# construction cost for the one-per-candidate items.
+@dataclass(slots=True)
 class RecommendationItem:
     track_id: str
     score: float
     breakdown: Dict[str, float]
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class RecommendationContext:
     cvs: float
     window_minutes: int
@@ -43,36 +47,31 @@ W4 = 0.1
 def generate_room_recommendations(
     session: Session, room: models.Room, limit: int = 10, include_recent: bool = True
 ) -> tuple[List[RecommendationItem], RecommendationContext]:
-    now = datetime.utcnow()
+    now = datetime.now(timezone.utc)
     window_start = now - timedelta(minutes=WINDOW_MINUTES)
 
-    messages = session.scalars(
-        select(models.ChatMessage)
-        .where(models.ChatMessage.room_id == room.id)
-        .where(models.ChatMessage.created_at >= window_start)
-    )
-    messages = list(messages)
-    message_count = len(messages)
-    user_count = len({m.user_id for m in messages}) or 1
-
-    reaction_count = session.scalar(
-        select(func.count(models.Reaction.id))
-        .join(models.ChatMessage, models.ChatMessage.id == models.Reaction.message_id)
+    message_count, user_count, last_message_ts = session.execute(
+        select(
+            func.count(models.ChatMessage.id),
+            func.count(models.ChatMessage.user_id.distinct()),
+            func.max(models.ChatMessage.created_at),
+        )
         .where(models.ChatMessage.room_id == room.id)
         .where(models.ChatMessage.created_at >= window_start)
-    ) or 0
+    ).one()
+    user_count = user_count or 1
 
-    likes_count = session.scalar(
-        select(func.count(models.Reaction.id))
+    reaction_count, likes_count = session.execute(
+        select(
+            func.count(models.Reaction.id),
+            func.count(models.Reaction.id).filter(models.Reaction.type == models.ReactionType.LIKE),
+        )
         .join(models.ChatMessage, models.ChatMessage.id == models.Reaction.message_id)
         .where(models.ChatMessage.room_id == room.id)
         .where(models.ChatMessage.created_at >= window_start)
-        .where(models.Reaction.type == models.ReactionType.LIKE)
-    ) or 0
+    ).one()
 
-    last_message_ts: Optional[datetime] = max(
-        (m.created_at for m in messages), default=room.updated_at
-    )
+    last_message_ts: Optional[datetime] = last_message_ts or room.updated_at
     delta_minutes = (
         max((now - last_message_ts).total_seconds(), 0.0) / 60.0 if last_message_ts else 60.0
     )
@@ -85,40 +84,50 @@ def generate_room_recommendations(
         delta_minutes=delta_minutes,
     )
 
-    current_embedding = _get_track_embedding(session, room.live_track_id)
-
-    history = session.scalars(
-        select(models.RoomTrackHistory)
-        .where(models.RoomTrackHistory.room_id == room.id)
-        .order_by(models.RoomTrackHistory.played_at.desc())
-        .limit(25)
+    recent_track_ids = list(
+        session.scalars(
+            select(models.RoomTrackHistory.track_id)
+            .where(models.RoomTrackHistory.room_id == room.id)
+            .order_by(models.RoomTrackHistory.played_at.desc())
+            .limit(25)
+        )
     )
-    recent_track_ids = [h.track_id for h in history]
     recent_seen = set(recent_track_ids[:5])
 
-    candidates = session.scalars(
-        select(models.Track).where(models.Track.artist_id == room.artist_id)
+    # Only the columns scoring reads: skipping full Track rows avoids decoding
+    # audio_features JSON and album metadata for every candidate.
+    candidate_stmt = select(
+        models.Track.id, models.Track.play_count, models.Track.last_played_at
+    ).where(models.Track.artist_id == room.artist_id)
+    if room.live_track_id:
+        candidate_stmt = candidate_stmt.where(models.Track.id != room.live_track_id)
+    if not include_recent and recent_seen:
+        candidate_stmt = candidate_stmt.where(models.Track.id.not_in(recent_seen))
+    candidates = session.execute(candidate_stmt).all()
+
+    queue_track_ids = set(
+        session.scalars(
+            select(models.QueueEntry.track_id).where(models.QueueEntry.room_id == room.id)
+        )
     )
 
-    queue_track_ids = {
-        entry.track_id
-        for entry in session.scalars(
-            select(models.QueueEntry).where(models.QueueEntry.room_id == room.id)
-        )
-    }
+    # One IN query for the live track and every candidate instead of a SELECT per track.
+    embeddings = _get_track_embeddings(
+        session, [track.id for track in candidates] + [room.live_track_id]
+    )
+    current_embedding, current_norm = embeddings.get(room.live_track_id, (None, 0.0))
+    # First (most recent) position of each track in the history window.
+    recent_positions: Dict[str, int] = {}
+    for index, track_id in enumerate(recent_track_ids):
+        recent_positions.setdefault(track_id, index)
 
     items: List[RecommendationItem] = []
-    for track in candidates:
-        if not include_recent and track.id in recent_seen:
-            continue
-        if track.id == room.live_track_id:
-            continue
-
-        embedding = _get_track_embedding(session, track.id)
-        cosine = _cosine_similarity(current_embedding, embedding) if embedding else 0.0
-        novelty = _novelty_score(track)
-        fatigue = _fatigue_penalty(track, recent_track_ids)
-        queue_penalty = 0.1 if track.id in queue_track_ids else 0.0
+    for track_id, play_count, last_played_at in candidates:
+        embedding = embeddings.get(track_id)
+        cosine = _cosine_similarity(current_embedding, current_norm, *embedding) if embedding else 0.0
+        novelty = _novelty_score(play_count, last_played_at, now)
+        fatigue = _fatigue_penalty(track_id, recent_positions)
+        queue_penalty = 0.1 if track_id in queue_track_ids else 0.0
 
         score = (
             W1 * cvs
@@ -133,10 +142,9 @@ def generate_room_recommendations(
             "fatigue": round(W4 * fatigue, 4),
             "queue_penalty": round(W4 * queue_penalty, 4),
         }
-        items.append(RecommendationItem(track_id=track.id, score=score, breakdown=breakdown))
+        items.append(RecommendationItem(track_id=track_id, score=score, breakdown=breakdown))
 
-    items.sort(key=lambda item: item.score, reverse=True)
-    items = items[:limit]
+    items = heapq.nlargest(limit, items, key=operator.attrgetter("score"))
 
     context = RecommendationContext(
         cvs=cvs,
@@ -164,40 +172,48 @@ def _compute_cvs(
     return round(base * decay, 4)
 
 
-def _get_track_embedding(session: Session, track_id: Optional[str]) -> Optional[List[float]]:
-    if not track_id:
-        return None
-    embedding = session.scalar(
-        select(models.Embedding).where(
+def _get_track_embeddings(
+    session: Session, track_ids: List[Optional[str]]
+) -> Dict[str, tuple[List[float], float]]:
+    """Map track id to its (vector, stored norm), computing the norm for rows stored without one."""
+
+    ids = {track_id for track_id in track_ids if track_id}
+    if not ids:
+        return {}
+    rows = session.execute(
+        select(models.Embedding.entity_id, models.Embedding.vector, models.Embedding.norm).where(
             models.Embedding.entity_type == models.EntityKind.TRACK,
-            models.Embedding.entity_id == track_id,
+            models.Embedding.entity_id.in_(ids),
         )
     )
-    return embedding.vector if embedding else None
+    return {
+        entity_id: (vector, norm or (models.embedding_norm(vector) if vector else 0.0))
+        for entity_id, vector, norm in rows
+    }
 
 
-def _cosine_similarity(a: Optional[List[float]], b: Optional[List[float]]) -> float:
-    if not a or not b or len(a) != len(b):
-        return 0.0
-    dot = sum(x * y for x, y in zip(a, b))
-    norm_a = math.sqrt(sum(x * x for x in a))
-    norm_b = math.sqrt(sum(y * y for y in b))
-    if norm_a == 0 or norm_b == 0:
+def _cosine_similarity(
+    query: Optional[List[float]], query_norm: float, vector: Optional[List[float]], vector_norm: float
+) -> float:
+    """Cosine similarity from the norms persisted on each embedding row."""
+
+    if not query or not vector or len(query) != len(vector) or query_norm == 0 or vector_norm == 0:
         return 0.0
-    return dot / (norm_a * norm_b)
+    # map(operator.mul) keeps the dot product's loop in C rather than a generator frame.
+    return sum(map(operator.mul, query, vector)) / (query_norm * vector_norm)
 
 
-def _novelty_score(track: models.Track) -> float:
-    base = 1.0 / (1.0 + track.play_count)
-    if track.last_played_at:
-        minutes_since = (datetime.utcnow() - track.last_played_at).total_seconds() / 60
+def _novelty_score(play_count: int, last_played_at: Optional[datetime], now: datetime) -> float:
+    base = 1.0 / (1.0 + play_count)
+    if last_played_at:
+        minutes_since = (now - last_played_at).total_seconds() / 60
         boost = min(minutes_since / 120, 1.0)
         return round(base + 0.2 * boost, 4)
     return round(base + 0.2, 4)
 
 
-def _fatigue_penalty(track: models.Track, recent_track_ids: List[str]) -> float:
-    if track.id not in recent_track_ids:
+def _fatigue_penalty(track_id: str, recent_positions: Dict[str, int]) -> float:
+    index = recent_positions.get(track_id)
+    if index is None:
         return 0.0
-    index = recent_track_ids.index(track.id)
     return round(max(0.0, 1.0 - index / 5), 4)
@@ -14,6 +14,20 @@ logger = logging.getLogger(__name__)
 
 SPOTIFY_TOKEN_URL = "https://accounts.spotify.com/api/token"
 
+# Shared across refreshes so repeated calls reuse keep-alive connections to accounts.spotify.com;
+# the pool is sized for bursts of expiring tokens refreshed from concurrent worker threads.
+_token_http = httpx.Client(
+    http2=True,
+    timeout=15.0,
+    limits=httpx.Limits(max_keepalive_connections=32, keepalive_expiry=60.0),
+)
+
+
+def close_token_client() -> None:
+    """Close the pooled token-endpoint connections; intended for shutdown."""
+
+    _token_http.close()
+
 
 class SpotifyTokenRefreshError(RuntimeError):
     """Raised when refreshing a Spotify access token fails."""
@@ -23,23 +37,8 @@ def ensure_valid_access_token(session: Session, user: models.User) -> Tuple[str,
     """Return a valid Spotify access token for the user, refreshing when needed."""
 
     now = datetime.now(timezone.utc)
-    expires_at_raw = user.token_expires_at
-    expires_at = None
-    if isinstance(expires_at_raw, datetime):
-        expires_at = expires_at_raw
-        if expires_at.tzinfo is None:
-            expires_at = expires_at.replace(tzinfo=timezone.utc)
-            user.token_expires_at = expires_at
-    elif isinstance(expires_at_raw, str) and expires_at_raw:
-        try:
-            parsed = datetime.fromisoformat(expires_at_raw)
-        except ValueError:
-            parsed = None
-        if parsed is not None:
-            if parsed.tzinfo is None:
-                parsed = parsed.replace(tzinfo=timezone.utc)
-            expires_at = parsed
-            user.token_expires_at = parsed
+    # UTCDateTime always loads an aware datetime, so the fresh-token path only reads the user.
+    expires_at = user.token_expires_at
     if expires_at and expires_at - timedelta(seconds=120) > now:
         remaining = int((expires_at - now).total_seconds())
         return user.access_token, max(remaining, 0)
@@ -59,7 +58,7 @@ def ensure_valid_access_token(session: Session, user: models.User) -> Tuple[str,
     }
 
     try:
-        response = httpx.post(SPOTIFY_TOKEN_URL, data=payload, timeout=15.0)
+        response = _token_http.post(SPOTIFY_TOKEN_URL, data=payload)
     except httpx.HTTPError as exc:  # pragma: no cover - network errors
         logger.exception("Failed to refresh Spotify token for user %s", user.id)
         raise SpotifyTokenRefreshError("Failed to call Spotify token endpoint") from exc
@@ -81,7 +80,6 @@ def ensure_valid_access_token(session: Session, user: models.User) -> Tuple[str,
     user.token_expires_at = now + timedelta(seconds=expires_in)
     if scope:
         user.scope = scope
-    session.add(user)
     session.flush()
 
     return access_token, expires_in
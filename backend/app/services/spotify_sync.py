@@ -1,31 +1,47 @@
 ﻿from __future__ import annotations
 
+import hashlib
 import logging
 import os
+import shelve
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-from dataclasses import dataclass
-from typing import Dict, Iterable, List, Optional, Sequence
-from uuid import uuid4
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, TypeVar
 
 import httpx
-from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session, selectinload
 
 from .. import models
+from ..utils.cache import TTLCache, artist_cache
 from .playback import upsert_playback_state
 
+T = TypeVar("T")
+R = TypeVar("R")
+
 logger = logging.getLogger(__name__)
 
 SPOTIFY_TOKEN_URL = "https://accounts.spotify.com/api/token"
 SPOTIFY_API_BASE = "https://api.spotify.com/v1"
+# Album and chunk lookups are independent GETs; keep the fan-out low enough to stay clear of Spotify's rate limit.
+SPOTIFY_FETCH_CONCURRENCY = 8
+# Keeps the spotify_id IN (...) lookup well under SQLite's bound-parameter limit.
+TRACK_LOOKUP_BATCH_SIZE = 500
+# Artists synced per transaction commit.
+SYNC_COMMIT_BATCH_SIZE = 10
+# Album track listings rarely change once released; on-disk entries are refetched after 30 days.
+# New releases still show up at once, since they arrive as new album ids, and --force renews entries.
+ALBUM_CACHE_TTL_SECONDS = 30 * 24 * 3600
 
 
 class SpotifySyncError(RuntimeError):
     """Raised when Spotify synchronization fails."""
 
 
-@dataclass
+@dataclass(slots=True)
 class SyncStats:
     artists_created: int = 0
     artists_updated: int = 0
@@ -36,13 +52,79 @@ class SyncStats:
     rooms_created: int = 0
     rooms_updated: int = 0
     queue_entries_created: int = 0
-    rooms_created: int = 0
-    rooms_updated: int = 0
-    queue_entries_created: int = 0
-
-
-def _chunked(items: Sequence[str], size: int) -> Iterable[List[str]]:
-    buf: List[str] = []
+    artists_unchanged: int = 0
+
+
+@dataclass(slots=True)
+class _AlbumInfo:
+    name: Optional[str]
+    uri: Optional[str]
+    image: Optional[str]
+
+
+@dataclass(slots=True)
+class _TrackStage:
+    # One pending track upsert; album metadata is shared by every track staged from that album.
+    album: _AlbumInfo
+    name: Optional[str]
+    duration_ms: Optional[int]
+    disc_number: Optional[int]
+    track_number: Optional[int]
+    explicit: bool
+    spotify_uri: Optional[str] = None
+    preview_url: Optional[str] = None
+    isrc: Optional[str] = None
+    popularity: Optional[int] = None
+    audio_features: dict = field(default_factory=dict)
+
+
+class _AlbumShelf:
+    """On-disk store of album payloads plus their full track listings, shared across sync runs."""
+
+    def __init__(self, path: str, market: str, ttl: float = ALBUM_CACHE_TTL_SECONDS) -> None:
+        self._path = path
+        self._market = market
+        self._ttl = ttl
+
+    def get_many(self, album_ids: Sequence[str]) -> Dict[str, tuple[dict, List[dict]]]:
+        found: Dict[str, tuple[dict, List[dict]]] = {}
+        cutoff = time.time() - self._ttl
+        with shelve.open(self._path) as shelf:
+            for album_id in album_ids:
+                entry = shelf.get(f"{self._market}:{album_id}")
+                if entry is not None and entry[0] >= cutoff:
+                    found[album_id] = (entry[1], entry[2])
+        return found
+
+    def set_many(self, albums: Dict[str, tuple[dict, List[dict]]]) -> None:
+        stored_at = time.time()
+        with shelve.open(self._path) as shelf:
+            for album_id, (album_payload, album_tracks) in albums.items():
+                shelf[f"{self._market}:{album_id}"] = (stored_at, album_payload, album_tracks)
+
+
+def _map_concurrently(func: Callable[[T], R], items: Sequence[T]) -> List[R]:
+    # The HTTP client is thread-safe, so lookups overlap instead of paying one round trip each.
+    # Results come back in input order.
+    if len(items) <= 1:
+        return [func(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(SPOTIFY_FETCH_CONCURRENCY, len(items))) as executor:
+        return list(executor.map(func, items))
+
+
+def _normalize_isrc(raw: Optional[str]) -> Optional[str]:
+    # Spotify passes label-supplied ISRCs through, some hyphenated ("US-RC1-76-07839")
+    # or padded; keep only well-formed 12-character codes so they fit Track.isrc.
+    if not raw:
+        return None
+    isrc = raw.replace("-", "").replace(" ", "").strip().upper()
+    if len(isrc) != 12 or not isrc.isalnum() or not isrc.isascii():
+        return None
+    return isrc
+
+
+def _chunked(items: Sequence[T], size: int) -> Iterable[List[T]]:
+    buf: List[T] = []
     for item in items:
         buf.append(item)
         if len(buf) == size:
@@ -53,18 +135,50 @@ def _chunked(items: Sequence[str], size: int) -> Iterable[List[str]]:
 
 
 class SpotifyClient:
-    def __init__(self, client_id: str, client_secret: str, timeout: float = 30.0) -> None:
+    def __init__(
+        self,
+        client_id: str,
+        client_secret: str,
+        timeout: float = 30.0,
+        cache_maxsize: int = 4096,
+        cache_ttl: float = 600.0,
+    ) -> None:
         self._client_id = client_id
         self._client_secret = client_secret
         self._token: Optional[str] = None
         self._token_expires_at: float = 0.0
-        self._http = httpx.Client(timeout=timeout)
+        self._token_refresh_at: float = 0.0
+        self._token_lock = threading.Lock()
+        # api.spotify.com speaks HTTP/2, so the concurrent catalog fetches multiplex over one TLS connection;
+        # the connection cap still allows the same fan-out if a server falls back to HTTP/1.1.
+        self._http = httpx.Client(
+            timeout=timeout,
+            http2=True,
+            limits=httpx.Limits(max_connections=SPOTIFY_FETCH_CONCURRENCY, max_keepalive_connections=SPOTIFY_FETCH_CONCURRENCY),
+        )
+        # Catalog GETs keyed by (path, params); albums shared between synced artists are only fetched once.
+        self._responses = TTLCache(maxsize=cache_maxsize, ttl=cache_ttl)
 
     def _ensure_token(self) -> str:
-        now = time.time()
-        if self._token and now < self._token_expires_at - 60:
+        now = time.monotonic()
+        if self._token and now < self._token_refresh_at:
             return self._token
 
+        if self._token and now < self._token_expires_at - 60:
+            # Still valid: one worker renews it early while the rest keep using the current token.
+            if not self._token_lock.acquire(blocking=False):
+                return self._token
+        else:
+            self._token_lock.acquire()
+        try:
+            if self._token and time.monotonic() < self._token_refresh_at:
+                return self._token
+            return self._fetch_token()
+        finally:
+            self._token_lock.release()
+
+    def _fetch_token(self) -> str:
+        now = time.monotonic()
         response = self._http.post(
             SPOTIFY_TOKEN_URL,
             data={"grant_type": "client_credentials"},
@@ -73,8 +187,10 @@ class SpotifyClient:
         if response.status_code != 200:
             raise SpotifySyncError(f"Failed to obtain Spotify token: {response.text}")
         payload = response.json()
+        expires_in = float(payload.get("expires_in", 3600))
         self._token = payload["access_token"]
-        self._token_expires_at = now + float(payload.get("expires_in", 3600))
+        self._token_expires_at = now + expires_in
+        self._token_refresh_at = now + min(expires_in * 0.8, expires_in - 60)
         return self._token
 
     def _request(self, method: str, path: str, *, params: Optional[dict] = None) -> httpx.Response:
@@ -97,29 +213,55 @@ class SpotifyClient:
         raise SpotifySyncError(f"Spotify API request failed after retries: {url}")
 
     def get_json(self, path: str, *, params: Optional[dict] = None) -> dict:
-        return self._request("GET", path, params=params).json()
+        key = (path, tuple(sorted((params or {}).items())))
+        cached = self._responses.get(key)
+        if cached is not None:
+            return cached
+        payload = self._request("GET", path, params=params).json()
+        self._responses.set(key, payload)
+        return payload
 
 
 class SpotifyCatalogSync:
-    def __init__(self, client_id: str, client_secret: str, market: str = "US") -> None:
+    def __init__(
+        self,
+        client_id: str,
+        client_secret: str,
+        market: str = "US",
+        album_cache_path: Optional[str] = None,
+    ) -> None:
         self.client = SpotifyClient(client_id, client_secret)
         self.market = market
+        self._album_shelf = _AlbumShelf(album_cache_path, market) if album_cache_path else None
+        # Set after the first 403 from /audio-features; the endpoint is restricted per app, so later calls would fail too.
+        self._audio_features_forbidden = False
 
-    def sync(self, session: Session, artist_ids: Sequence[str]) -> SyncStats:
+    def sync(self, session: Session, artist_ids: Sequence[str], *, force: bool = False) -> SyncStats:
         stats = SyncStats()
         unique_ids = [artist_id.strip() for artist_id in artist_ids if artist_id.strip()]
-        for artist_id in unique_ids:
-            logger.info("Syncing artist %s", artist_id)
+        for batch in _chunked(unique_ids, SYNC_COMMIT_BATCH_SIZE):
+            # One commit per batch; each artist runs in a savepoint so a failure only undoes that artist.
+            synced: List[str] = []
             try:
-                self._sync_artist(session, artist_id, stats)
+                for artist_id in batch:
+                    logger.info("Syncing artist %s", artist_id)
+                    try:
+                        with session.begin_nested():
+                            artist = self._sync_artist(session, artist_id, stats, force=force)
+                    except Exception:
+                        logger.exception("Failed syncing artist %s", artist_id)
+                        raise
+                    synced.append(artist.id)
+            finally:
+                # Artists synced before a failure are kept, as they were when every artist committed on its own.
                 session.commit()
-            except Exception:
-                session.rollback()
-                logger.exception("Failed syncing artist %s", artist_id)
-                raise
+                for synced_id in synced:
+                    artist_cache.pop(synced_id)
         return stats
 
-    def _sync_artist(self, session: Session, spotify_artist_id: str, stats: SyncStats) -> None:
+    def _sync_artist(
+        self, session: Session, spotify_artist_id: str, stats: SyncStats, *, force: bool = False
+    ) -> models.Artist:
         artist_payload = self.client.get_json(f"/artists/{spotify_artist_id}")
         artist, created = self._upsert_artist(session, artist_payload)
         if created:
@@ -128,17 +270,24 @@ class SpotifyCatalogSync:
             stats.artists_updated += 1
 
         album_ids = self._collect_artist_album_ids(spotify_artist_id)
-        track_payloads: Dict[str, dict] = {}
-
-        for album_id in album_ids:
-            album_payload = self.client.get_json(f"/albums/{album_id}", params={"market": self.market})
+        # Same album list as the last successful sync: tracks and rooms are already seeded, so skip
+        # the album, track and feature fetches. The hash only persists if this sync commits.
+        catalog_hash = hashlib.blake2b(",".join(sorted(album_ids)).encode(), digest_size=16).hexdigest()
+        if not force and artist.catalog_hash == catalog_hash:
+            logger.info("Artist %s catalogue unchanged; skipping album sync", spotify_artist_id)
+            stats.artists_unchanged += 1
+            return artist
+        artist.catalog_hash = catalog_hash
+        track_payloads: Dict[str, _TrackStage] = {}
+
+        for album_payload, album_tracks in self._fetch_albums(album_ids, refresh=force):
             stats.albums_processed += 1
-            album_info = {
-                "name": album_payload.get("name"),
-                "uri": album_payload.get("uri"),
-                "image": album_payload.get("images", [{}])[0].get("url"),
-            }
-            for track_item in self._iterate_album_tracks(album_payload):
+            album_info = _AlbumInfo(
+                name=album_payload.get("name"),
+                uri=album_payload.get("uri"),
+                image=album_payload.get("images", [{}])[0].get("url"),
+            )
+            for track_item in album_tracks:
                 track_id = track_item.get("id")
                 if not track_id:
                     continue
@@ -147,61 +296,90 @@ class SpotifyCatalogSync:
                 artist_ids = {a.get("id") for a in track_item.get("artists", []) if a.get("id")}
                 if spotify_artist_id not in artist_ids:
                     continue
-                track_payloads[track_id] = {
-                    "artist": artist,
-                    "album": album_info,
-                    "name": track_item.get("name"),
-                    "duration_ms": track_item.get("duration_ms"),
-                    "disc_number": track_item.get("disc_number", 1),
-                    "track_number": track_item.get("track_number", 0),
-                    "explicit": bool(track_item.get("explicit")),
-                }
+                track_payloads[track_id] = _TrackStage(
+                    album=album_info,
+                    name=track_item.get("name"),
+                    duration_ms=track_item.get("duration_ms"),
+                    disc_number=track_item.get("disc_number", 1),
+                    track_number=track_item.get("track_number", 0),
+                    explicit=bool(track_item.get("explicit")),
+                )
 
         if not track_payloads:
-            return
+            return artist
 
         stats.tracks_seen += len(track_payloads)
 
+        existing_tracks = self._load_existing_tracks(session, artist, list(track_payloads.keys()))
         detail_map = self._fetch_track_details(list(track_payloads.keys()))
-        features_map = self._fetch_audio_features(list(track_payloads.keys()))
-
-        for track_id, payload in track_payloads.items():
+        # Stored features are kept when none are fetched, so only ask Spotify about tracks that lack them.
+        missing_features = [
+            track_id
+            for track_id in track_payloads
+            if track_id not in existing_tracks or not existing_tracks[track_id].audio_features
+        ]
+        features_map = self._fetch_audio_features(missing_features)
+
+        new_track_rows: List[dict] = []
+        for track_id, stage in track_payloads.items():
             detail = detail_map.get(track_id)
             if detail is None:
                 continue
-            payload.update(
-                {
-                    "spotify_id": track_id,
-                    "spotify_uri": detail.get("uri"),
-                    "name": detail.get("name") or payload.get("name"),
-                    "duration_ms": detail.get("duration_ms") or payload.get("duration_ms") or 0,
-                    "preview_url": detail.get("preview_url"),
-                    "isrc": detail.get("external_ids", {}).get("isrc"),
-                    "popularity": detail.get("popularity", 0),
-                }
-            )
-            audio_features = features_map.get(track_id) or {}
-            payload["audio_features"] = audio_features
-            created = self._upsert_track(session, payload)
+            stage.spotify_uri = detail.get("uri")
+            stage.name = detail.get("name") or stage.name
+            stage.duration_ms = detail.get("duration_ms") or stage.duration_ms or 0
+            stage.preview_url = detail.get("preview_url")
+            stage.isrc = _normalize_isrc(detail.get("external_ids", {}).get("isrc"))
+            stage.popularity = detail.get("popularity", 0)
+            stage.audio_features = features_map.get(track_id) or {}
+            created = self._upsert_track(artist, track_id, stage, existing_tracks, new_track_rows)
             if created:
                 stats.tracks_created += 1
             else:
                 stats.tracks_updated += 1
 
         session.flush()
-        self._ensure_artist_rooms(session, artist, stats)
-
-    def _ensure_artist_rooms(self, session: Session, artist: models.Artist, stats: SyncStats) -> None:
-        tracks = list(
-            session.scalars(
-                select(models.Track)
-                .where(models.Track.artist_id == artist.id)
-                .order_by(models.Track.album_uri, models.Track.disc_number, models.Track.track_number, models.Track.title)
-            )
+        self._insert_tracks(session, new_track_rows, existing_tracks)
+        # existing_tracks already holds every track the artist owns after this sync, so rooms are built without re-selecting them.
+        artist_tracks = sorted(
+            (track for track in existing_tracks.values() if track.artist_id == artist.id),
+            key=lambda t: (
+                t.album_uri is not None,
+                t.album_uri or "",
+                t.disc_number or 0,
+                t.track_number or 0,
+                t.title or "",
+            ),
         )
+        self._ensure_artist_rooms(session, artist, stats, artist_tracks)
+        return artist
+
+    def _ensure_artist_rooms(
+        self,
+        session: Session,
+        artist: models.Artist,
+        stats: SyncStats,
+        tracks: List[models.Track],
+    ) -> None:
         if not tracks:
             return
 
+        # Load the artist's seeded rooms and their queues once rather than per album room.
+        rooms_by_name: Dict[str, models.Room] = {}
+        for room in session.scalars(
+            select(models.Room).where(models.Room.artist_id == artist.id).options(selectinload(models.Room.playback_state))
+        ):
+            rooms_by_name.setdefault(room.name, room)
+        queued: Dict[str, List[tuple[str, int]]] = {}
+        if rooms_by_name:
+            rows = session.execute(
+                select(models.QueueEntry.room_id, models.QueueEntry.track_id, models.QueueEntry.position).where(
+                    models.QueueEntry.room_id.in_([room.id for room in rooms_by_name.values()])
+                )
+            )
+            for room_id, track_id, position in rows:
+                queued.setdefault(room_id, []).append((track_id, position))
+
         all_rules: Dict[str, object] = {
             'kind': 'artist_all',
             'spotify_artist_id': artist.spotify_id,
@@ -217,6 +395,8 @@ class SpotifyCatalogSync:
             tracks=tracks,
             rules=all_rules,
             featured=True,
+            rooms_by_name=rooms_by_name,
+            queued=queued,
         )
 
         album_groups: Dict[str, List[models.Track]] = {}
@@ -226,7 +406,7 @@ class SpotifyCatalogSync:
             album_groups.setdefault(track.album_uri, []).append(track)
 
         for album_uri, album_tracks in album_groups.items():
-            album_tracks.sort(key=lambda t: (t.disc_number, t.track_number, t.title))
+            album_tracks.sort(key=lambda t: (t.disc_number or 0, t.track_number or 0, t.title or ""))
             album_name = album_tracks[0].album_name or 'Album'
             album_rules: Dict[str, object] = {
                 'kind': 'album',
@@ -245,6 +425,8 @@ class SpotifyCatalogSync:
                 tracks=album_tracks,
                 rules=album_rules,
                 featured=False,
+                rooms_by_name=rooms_by_name,
+                queued=queued,
             )
 
     def _ensure_room_with_tracks(
@@ -258,6 +440,8 @@ class SpotifyCatalogSync:
         tracks: Sequence[models.Track],
         rules: Dict[str, object],
         featured: bool,
+        rooms_by_name: Dict[str, models.Room],
+        queued: Dict[str, List[tuple[str, int]]],
     ) -> None:
         if not tracks:
             return
@@ -265,12 +449,7 @@ class SpotifyCatalogSync:
         stamped_rules = dict(rules)
         stamped_rules['seeded_at'] = datetime.now(timezone.utc).isoformat()
 
-        room = session.scalar(
-            select(models.Room).where(
-                models.Room.artist_id == artist.id,
-                models.Room.name == name,
-            )
-        )
+        room = rooms_by_name.get(name)
         created = False
         if room is None:
             room = models.Room(
@@ -283,6 +462,7 @@ class SpotifyCatalogSync:
             )
             session.add(room)
             session.flush()
+            rooms_by_name[name] = room
             created = True
         else:
             merged_rules = dict(room.rules or {})
@@ -294,27 +474,27 @@ class SpotifyCatalogSync:
                 room.is_featured = True
             session.add(room)
 
-        existing_entries = list(
-            session.scalars(
-                select(models.QueueEntry)
-                .where(models.QueueEntry.room_id == room.id)
-                .order_by(models.QueueEntry.position)
-            )
-        )
-        existing_track_ids = {entry.track_id for entry in existing_entries}
-        next_position = max((entry.position for entry in existing_entries), default=0)
+        existing_entries = queued.get(room.id, [])
+        existing_track_ids = {track_id for track_id, _ in existing_entries}
+        next_position = max((position for _, position in existing_entries), default=0)
+        new_rows: List[dict] = []
         for track in tracks:
             if track.id in existing_track_ids:
                 continue
             next_position += 1
-            entry = models.QueueEntry(
-                room_id=room.id,
-                track_id=track.id,
-                position=next_position,
-                note="Seeded from Spotify",
+            new_rows.append(
+                {
+                    "room_id": room.id,
+                    "track_id": track.id,
+                    "position": next_position,
+                    "note": "Seeded from Spotify",
+                }
             )
-            session.add(entry)
-            stats.queue_entries_created += 1
+        if new_rows:
+            # Seeded entries are never read back during the sync, so one executemany beats building ORM objects.
+            session.execute(insert(models.QueueEntry), new_rows)
+            queued.setdefault(room.id, []).extend((row["track_id"], row["position"]) for row in new_rows)
+        stats.queue_entries_created += len(new_rows)
 
         if created or room.playback_state is None:
             first_track = tracks[0]
@@ -351,22 +531,40 @@ class SpotifyCatalogSync:
             params = None
         return album_ids
 
-    def _iterate_album_tracks(self, album_payload: dict) -> Iterable[dict]:
+    def _fetch_albums(self, album_ids: List[str], *, refresh: bool = False) -> List[tuple[dict, List[dict]]]:
+        # Album order is preserved, which keeps first-seen track attribution stable.
+        # refresh skips shelf reads but still rewrites the entries, so a forced sync
+        # also renews cached albums.
+        params = {"market": self.market}
+
+        def fetch_album(album_id: str) -> tuple[dict, List[dict]]:
+            album_payload = self.client.get_json(f"/albums/{album_id}", params=params)
+            return album_payload, self._collect_album_tracks(album_payload)
+
+        cached = self._album_shelf.get_many(album_ids) if self._album_shelf and not refresh else {}
+        missing = [album_id for album_id in album_ids if album_id not in cached]
+        fetched = dict(zip(missing, _map_concurrently(fetch_album, missing)))
+        if self._album_shelf and fetched:
+            self._album_shelf.set_many(fetched)
+        return [cached[album_id] if album_id in cached else fetched[album_id] for album_id in album_ids]
+
+    def _collect_album_tracks(self, album_payload: dict) -> List[dict]:
+        # Runs on the album's worker, so long track listings page in parallel with other albums.
         tracks = album_payload.get("tracks", {})
-        items = tracks.get("items", [])
-        for item in items:
-            yield item
+        items = list(tracks.get("items", []))
         next_url = tracks.get("next")
         while next_url:
             payload = self.client.get_json(next_url)
-            for item in payload.get("items", []):
-                yield item
+            items.extend(payload.get("items", []))
             next_url = payload.get("next")
+        return items
 
     def _fetch_track_details(self, track_ids: List[str]) -> Dict[str, dict]:
+        # Spotify ids are base62, so the id list goes into the URL as-is rather than through the
+        # params encoder (which would also percent-encode every comma).
         detail_map: Dict[str, dict] = {}
-        for chunk in _chunked(track_ids, 50):
-            data = self.client.get_json("/tracks", params={"ids": ",".join(chunk)})
+        chunks = list(_chunked(track_ids, 50))
+        for data in _map_concurrently(lambda chunk: self.client.get_json("/tracks?ids=" + ",".join(chunk)), chunks):
             for item in data.get("tracks", []) or []:
                 if item:
                     detail_map[item.get("id")] = item
@@ -374,15 +572,23 @@ class SpotifyCatalogSync:
 
     def _fetch_audio_features(self, track_ids: List[str]) -> Dict[str, dict]:
         features: Dict[str, dict] = {}
-        for chunk in _chunked(track_ids, 100):
+        if self._audio_features_forbidden:
+            return features
+
+        def fetch_chunk(chunk: List[str]) -> dict:
+            if self._audio_features_forbidden:
+                return {}
             try:
-                data = self.client.get_json("/audio-features", params={"ids": ",".join(chunk)})
+                return self.client.get_json("/audio-features?ids=" + ",".join(chunk))
             except SpotifySyncError as exc:
                 message = str(exc)
                 if "403" in message:
                     logger.warning("Skipping audio features for %s tracks due to 403 response", len(chunk))
-                    continue
+                    self._audio_features_forbidden = True
+                    return {}
                 raise
+
+        for data in _map_concurrently(fetch_chunk, list(_chunked(track_ids, 100))):
             for item in data.get("audio_features", []) or []:
                 if item and item.get("id"):
                     features[item["id"]] = item
@@ -396,7 +602,7 @@ class SpotifyCatalogSync:
         created = False
         if artist is None:
             artist = models.Artist(
-                id=str(uuid4()),
+                id=models.uuid7(),
                 spotify_id=spotify_id,
                 spotify_uri=payload.get("uri", f"spotify:artist:{spotify_id}"),
                 spotify_url=payload.get("external_urls", {}).get("spotify"),
@@ -415,59 +621,88 @@ class SpotifyCatalogSync:
             artist.followers = payload.get("followers", {}).get("total", artist.followers) or artist.followers
             artist.popularity = payload.get("popularity", artist.popularity) or artist.popularity
 
+        artist.popularity_rank = models.artist_popularity_rank(artist.popularity, artist.followers)
         genres = payload.get("genres", []) or []
         artist.metadata_json = {**(artist.metadata_json or {}), "genres": genres, "images": payload.get("images", [])}
         return artist, created
 
-    def _upsert_track(self, session: Session, payload: dict) -> bool:
-        artist: models.Artist = payload["artist"]
-        spotify_id = payload.get("spotify_id")
+    def _load_existing_tracks(
+        self, session: Session, artist: models.Artist, spotify_ids: List[str]
+    ) -> Dict[str, models.Track]:
+        # All of the artist's tracks (including ones this sync no longer sees), plus any incoming
+        # Spotify ids currently attributed to another artist.
+        existing: Dict[str, models.Track] = {
+            track.spotify_id: track
+            for track in session.scalars(select(models.Track).where(models.Track.artist_id == artist.id))
+        }
+        missing = [spotify_id for spotify_id in spotify_ids if spotify_id not in existing]
+        for chunk in _chunked(missing, TRACK_LOOKUP_BATCH_SIZE):
+            for track in session.scalars(select(models.Track).where(models.Track.spotify_id.in_(chunk))):
+                existing[track.spotify_id] = track
+        return existing
+
+    def _insert_tracks(
+        self, session: Session, rows: List[dict], existing_tracks: Dict[str, models.Track]
+    ) -> None:
+        # ORM bulk INSERT ... RETURNING: one executemany per batch, and the returned rows are
+        # persistent Track instances the room seeding can use directly.
+        for batch in _chunked(rows, TRACK_LOOKUP_BATCH_SIZE):
+            statement = insert(models.Track).returning(models.Track, sort_by_parameter_order=True)
+            for track in session.scalars(statement, batch):
+                existing_tracks[track.spotify_id] = track
+
+    def _upsert_track(
+        self,
+        artist: models.Artist,
+        spotify_id: str,
+        stage: _TrackStage,
+        existing_tracks: Dict[str, models.Track],
+        new_rows: List[dict],
+    ) -> bool:
         if not spotify_id:
             return False
-        track = session.scalar(select(models.Track).where(models.Track.spotify_id == spotify_id))
+        track = existing_tracks.get(spotify_id)
+        spotify_uri = stage.spotify_uri or "spotify:track:" + spotify_id
         created = False
         if track is None:
-            track = models.Track(
-                id=str(uuid4()),
-                artist_id=artist.id,
-                spotify_id=spotify_id,
-                spotify_uri=payload.get("spotify_uri", f"spotify:track:{spotify_id}"),
-                title=payload.get("name") or "Unknown Track",
-                uri=payload.get("spotify_uri", f"spotify:track:{spotify_id}"),
-                duration_ms=payload.get("duration_ms", 0) or 0,
-                album_name=payload.get("album", {}).get("name"),
-                album_uri=payload.get("album", {}).get("uri"),
-                album_image_url=payload.get("album", {}).get("image"),
-                disc_number=payload.get("disc_number", 1) or 1,
-                track_number=payload.get("track_number", 0) or 0,
-                explicit=payload.get("explicit", False),
-                preview_url=payload.get("preview_url"),
-                isrc=payload.get("isrc"),
-                popularity=payload.get("popularity", 0) or 0,
-                audio_features=payload.get("audio_features", {}),
-                lyrics_ref=None,
+            new_rows.append(
+                {
+                    "id": models.uuid7(),
+                    "artist_id": artist.id,
+                    "spotify_id": spotify_id,
+                    "spotify_uri": spotify_uri,
+                    "title": stage.name or "Unknown Track",
+                    "uri": spotify_uri,
+                    "duration_ms": stage.duration_ms or 0,
+                    "album_name": stage.album.name,
+                    "album_uri": stage.album.uri,
+                    "album_image_url": stage.album.image,
+                    "disc_number": stage.disc_number or 1,
+                    "track_number": stage.track_number or 0,
+                    "explicit": stage.explicit,
+                    "preview_url": stage.preview_url,
+                    "isrc": stage.isrc,
+                    "popularity": stage.popularity or 0,
+                    "audio_features": stage.audio_features,
+                    "lyrics_ref": None,
+                }
             )
-            session.add(track)
             created = True
         else:
             track.artist_id = artist.id
-            track.spotify_uri = payload.get("spotify_uri", track.spotify_uri)
-            track.title = payload.get("name", track.title)
-            track.uri = payload.get("spotify_uri", track.uri)
-            track.duration_ms = payload.get("duration_ms", track.duration_ms)
-            track.album_name = payload.get("album", {}).get("name") or track.album_name
-            track.album_uri = payload.get("album", {}).get("uri") or track.album_uri
-            track.album_image_url = payload.get("album", {}).get("image") or track.album_image_url
-            track.disc_number = payload.get("disc_number", track.disc_number)
-            track.track_number = payload.get("track_number", track.track_number)
-            track.explicit = payload.get("explicit", track.explicit)
-            track.preview_url = payload.get("preview_url") or track.preview_url
-            track.isrc = payload.get("isrc") or track.isrc
-            track.popularity = payload.get("popularity", track.popularity)
-            features = payload.get("audio_features")
-            if features:
-                track.audio_features = features
+            track.spotify_uri = spotify_uri
+            track.title = stage.name
+            track.uri = spotify_uri
+            track.duration_ms = stage.duration_ms
+            track.album_name = stage.album.name or track.album_name
+            track.album_uri = stage.album.uri or track.album_uri
+            track.album_image_url = stage.album.image or track.album_image_url
+            track.disc_number = stage.disc_number
+            track.track_number = stage.track_number
+            track.explicit = stage.explicit
+            track.preview_url = stage.preview_url or track.preview_url
+            track.isrc = stage.isrc or track.isrc
+            track.popularity = stage.popularity
+            if stage.audio_features:
+                track.audio_features = stage.audio_features
         return created
-
-
-
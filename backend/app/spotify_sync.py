@@ -24,6 +24,16 @@ def parse_args() -> argparse.Namespace:
         help="Spotify market code for album/track lookups",
         default=os.getenv("SPOTIFY_CATALOG_MARKET", "US"),
     )
+    parser.add_argument(
+        "--album-cache",
+        help="Path of an on-disk cache for album payloads, reused across runs",
+        default=os.getenv("SPOTIFY_ALBUM_CACHE_PATH"),
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Re-sync artists even when their album list is unchanged since the last run, bypassing the album cache",
+    )
     return parser.parse_args()
 
 
@@ -36,9 +46,14 @@ def main() -> None:
     client_id, client_secret = ensure_spotify_credentials_env()
 
     init_db()
-    syncer = SpotifyCatalogSync(client_id=client_id, client_secret=client_secret, market=args.market)
+    syncer = SpotifyCatalogSync(
+        client_id=client_id,
+        client_secret=client_secret,
+        market=args.market,
+        album_cache_path=args.album_cache,
+    )
     with SessionLocal() as session:
-        stats = syncer.sync(session, artist_ids)
+        stats = syncer.sync(session, artist_ids, force=args.force)
 
     logger.info(
         "Sync complete: artists created=%s updated=%s, tracks created=%s updated=%s, albums processed=%s, tracks seen=%s, rooms created=%s updated=%s, queue entries added=%s",
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import os
+import re
 from pathlib import Path
 from typing import Tuple
 
@@ -8,6 +9,9 @@ __all__ = ["load_spotify_credentials", "ensure_spotify_credentials_env"]
 
 DEFAULT_CREDENTIALS_FILENAME = "credentials.md"
 
+# "key: value" lines; blank lines, comments and lines without a colon never match.
+_CREDENTIAL_LINE_RE = re.compile(r"^[ \t]*([^#:\s][^:\n]*):(.*)$", re.MULTILINE)
+
 
 def _resolve_credentials_path(explicit: str | os.PathLike[str] | None = None) -> Path:
     if explicit:
@@ -24,21 +28,10 @@ def load_spotify_credentials(path: str | os.PathLike[str] | None = None) -> Tupl
     if not credentials_path.is_file():
         raise FileNotFoundError(f"Spotify credentials file not found: {credentials_path}")
 
-    client_id: str | None = None
-    client_secret: str | None = None
-
-    for raw_line in credentials_path.read_text(encoding="utf-8").splitlines():
-        line = raw_line.strip()
-        if not line or line.startswith("#"):
-            continue
-        if ":" not in line:
-            continue
-        key, value = [item.strip() for item in line.split(":", 1)]
-        key_lower = key.lower()
-        if key_lower == "client id":
-            client_id = value
-        elif key_lower == "client secret":
-            client_secret = value
+    text = credentials_path.read_text(encoding="utf-8")
+    entries = {match.group(1).strip().lower(): match.group(2).strip() for match in _CREDENTIAL_LINE_RE.finditer(text)}
+    client_id = entries.get("client id")
+    client_secret = entries.get("client secret")
 
     if not client_id or not client_secret:
         raise ValueError(
@@ -61,6 +61,16 @@ def _build_parser() -> argparse.ArgumentParser:
         help="Spotify market code for album/track lookups.",
         default=os.getenv("SPOTIFY_CATALOG_MARKET", "US"),
     )
+    parser.add_argument(
+        "--album-cache",
+        help="Path of an on-disk cache for album payloads, reused across runs. Defaults to SPOTIFY_ALBUM_CACHE_PATH.",
+        default=os.getenv("SPOTIFY_ALBUM_CACHE_PATH"),
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Re-sync artists even when their album list is unchanged since the last run, bypassing the album cache.",
+    )
     parser.add_argument(
         "--credentials",
         help="Optional override for the credentials.md path.",
@@ -89,11 +99,16 @@ def main(argv: list[str] | None = None) -> int:
     client_id, client_secret = ensure_spotify_credentials_env(args.credentials)
     LOGGER.info("Using Spotify client %s", client_id)
     init_db()
-    syncer = SpotifyCatalogSync(client_id=client_id, client_secret=client_secret, market=args.market)
+    syncer = SpotifyCatalogSync(
+        client_id=client_id,
+        client_secret=client_secret,
+        market=args.market,
+        album_cache_path=args.album_cache,
+    )
 
     try:
         with SessionLocal() as session:
-            stats = syncer.sync(session, artist_ids)
+            stats = syncer.sync(session, artist_ids, force=args.force)
     except SpotifySyncError as exc:
         LOGGER.error("Spotify sync failed: %s", exc)
         return 1
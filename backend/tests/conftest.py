@@ -0,0 +1,38 @@
+﻿import os
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# The app reads its configuration at import time, so point it at a throwaway
+# database and dummy Spotify credentials before any test module imports it.
+_TEST_DB_DIR = Path(tempfile.mkdtemp(prefix="looproom-tests-"))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{(_TEST_DB_DIR / 'test.db').as_posix()}")
+os.environ.setdefault("SPOTIFY_CLIENT_ID", "test-client-id")
+os.environ.setdefault("SPOTIFY_CLIENT_SECRET", "test-client-secret")
+
+
+@pytest.fixture(scope="session")
+def _schema():
+    from app.database import init_db
+
+    init_db()
+
+
+@pytest.fixture
+def db_session(_schema):
+    from app import models
+    from app.database import SessionLocal
+    from app.utils.cache import artist_cache, session_user_cache, spotify_token_cache
+
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.rollback()
+        for table in reversed(models.Base.metadata.sorted_tables):
+            session.execute(table.delete())
+        session.commit()
+        session.close()
+        for cache in (artist_cache, session_user_cache, spotify_token_cache):
+            cache.clear()
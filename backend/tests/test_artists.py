@@ -0,0 +1,76 @@
+﻿from fastapi.testclient import TestClient
+
+from app import models
+from app.main import app
+
+
+client = TestClient(app)
+
+
+def _add_artist(session, name: str, popularity: int, followers: int) -> models.Artist:
+    artist = models.Artist(
+        spotify_id=f"sp-{name}",
+        spotify_uri=f"spotify:artist:sp-{name}",
+        name=name,
+        popularity=popularity,
+        followers=followers,
+        popularity_rank=models.artist_popularity_rank(popularity, followers),
+        metadata_json={"genres": [f"{name}-genre"]},
+    )
+    session.add(artist)
+    return artist
+
+
+def test_list_artists_walks_cursor_across_rank_ties(db_session):
+    # Five artists share one rank, so only the id tiebreaker keeps pages apart.
+    tied = [_add_artist(db_session, f"tied-{i}", 50, 1000) for i in range(5)]
+    top = _add_artist(db_session, "top", 90, 10)
+    low = _add_artist(db_session, "low", 10, 10)
+    db_session.commit()
+
+    seen = []
+    pages = 0
+    cursor = None
+    while True:
+        params = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/api/artists", params=params)
+        assert response.status_code == 200
+        seen.extend(response.json())
+        pages += 1
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+
+    assert pages == 4
+    expected = [top.id, *sorted(artist.id for artist in tied), low.id]
+    assert [item["id"] for item in seen] == expected
+    assert seen[0]["metadata"] == {"genres": ["top-genre"]}
+    assert "popularity_rank" not in seen[0]
+
+
+def test_list_artists_without_paging_params_returns_everything(db_session):
+    artists = [_add_artist(db_session, f"artist-{i}", i, i) for i in range(60)]
+    db_session.commit()
+
+    response = client.get("/api/artists")
+    assert response.status_code == 200
+    assert "X-Next-Cursor" not in response.headers
+    assert len(response.json()) == len(artists)
+
+
+def test_list_and_detail_share_artist_shape(db_session):
+    artist = _add_artist(db_session, "solo", 40, 400)
+    db_session.commit()
+
+    listed = client.get("/api/artists").json()[0]
+    detail = client.get(f"/api/artists/{artist.id}").json()
+    assert listed == detail
+    assert detail["metadata"] == {"genres": ["solo-genre"]}
+    assert {"spotify_url", "created_at", "updated_at"} <= detail.keys()
+
+
+def test_list_artists_rejects_malformed_cursor(db_session):
+    response = client.get("/api/artists", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
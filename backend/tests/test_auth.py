@@ -0,0 +1,79 @@
+﻿from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import httpx
+from fastapi.testclient import TestClient
+
+from app import models, security
+from app.main import app
+from app.utils import cache
+from app.security import SESSION_COOKIE_NAME, create_session_token
+from app.utils.cache import session_user_cache, spotify_token_cache
+
+
+def _add_user(session, spotify_id: str = "sp-user") -> models.User:
+    user = models.User(
+        spotify_id=spotify_id,
+        display_name="Listener",
+        access_token="access-token",
+        refresh_token="refresh-token",
+        token_expires_at=datetime.now(timezone.utc) + timedelta(hours=1),
+    )
+    session.add(user)
+    session.commit()
+    return user
+
+
+def test_logout_drops_the_cached_session(db_session):
+    user = _add_user(db_session)
+    token = create_session_token(user.id)
+    client = TestClient(app, cookies={SESSION_COOKIE_NAME: token})
+
+    assert client.get("/api/users/me").status_code == 200
+    assert session_user_cache.get(token) == user.id
+
+    assert client.post("/auth/logout").status_code == 204
+    assert session_user_cache.get(token) is None
+
+
+def test_cached_session_does_not_outlive_the_token(db_session, monkeypatch):
+    user = _add_user(db_session)
+    token = create_session_token(user.id)
+    monkeypatch.setattr(security, "SESSION_MAX_AGE", 5)
+    clock = [1000.0]
+    monkeypatch.setattr(cache, "time", SimpleNamespace(monotonic=lambda: clock[0]))
+    client = TestClient(app, cookies={SESSION_COOKIE_NAME: token})
+
+    assert client.get("/api/users/me").status_code == 200
+    assert session_user_cache.get(token) == user.id
+
+    # Well inside the cache's own 60 s lifetime, but past the token's max_age.
+    clock[0] += 6
+    assert session_user_cache.get(token) is None
+
+
+def test_login_drops_the_cached_playback_token(db_session, monkeypatch):
+    user = _add_user(db_session)
+    db_session.add(models.SpotifyAuthState(state="login-state", redirect_uri="/rooms"))
+    db_session.commit()
+    spotify_token_cache.set(user.id, ("stale-token", 0.0))
+
+    def spotify(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/api/token":
+            return httpx.Response(
+                200, json={"access_token": "fresh-token", "refresh_token": "new-refresh", "expires_in": 3600}
+            )
+        return httpx.Response(200, json={"id": user.spotify_id, "display_name": "Listener"})
+
+    monkeypatch.setattr(
+        app.state, "http_client", httpx.AsyncClient(transport=httpx.MockTransport(spotify)), raising=False
+    )
+    response = TestClient(app).get(
+        "/auth/spotify/callback", params={"code": "auth-code", "state": "login-state"}, follow_redirects=False
+    )
+
+    assert response.status_code == 303
+    assert response.headers["location"] == "/rooms"
+    assert spotify_token_cache.get(user.id) is None
+    db_session.expire_all()
+    assert db_session.get(models.User, user.id).access_token == "fresh-token"
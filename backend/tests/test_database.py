@@ -0,0 +1,39 @@
+﻿from array import array
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.database import CURRENT_SCHEMA_VERSION, init_db
+from app.models import UTCDateTime
+
+
+def test_version_8_database_gains_backfilled_embedding_norms(db_session):
+    # Recreate the schema version 8 layout: packed vectors, no norm column.
+    db_session.execute(text("ALTER TABLE embeddings DROP COLUMN norm"))
+    db_session.execute(
+        text(
+            "INSERT INTO embeddings (entity_type, entity_id, vector, model_version, dimensionality, created_at, updated_at) "
+            "VALUES ('TRACK', 'track-1', :vector, 'v0', 2, '2024-01-01', '2024-01-01')"
+        ),
+        {"vector": array("f", [3.0, 4.0]).tobytes()},
+    )
+    db_session.execute(text("PRAGMA user_version = 8"))
+    db_session.commit()
+
+    init_db()
+
+    assert db_session.execute(text("PRAGMA user_version")).scalar() == CURRENT_SCHEMA_VERSION
+    norm = db_session.execute(text("SELECT norm FROM embeddings WHERE entity_id = 'track-1'")).scalar()
+    assert norm == pytest.approx(5.0)
+
+
+def test_utc_datetime_keeps_offset_off_sqlite():
+    column_type = UTCDateTime()
+    value = datetime(2024, 1, 1, 12, 0, tzinfo=timezone(timedelta(hours=2)))
+
+    bound = column_type.process_bind_param(value, postgresql.dialect())
+    assert bound.tzinfo is not None
+    assert bound == value
+    assert column_type.process_bind_param(value, sqlite.dialect()) == datetime(2024, 1, 1, 10, 0)
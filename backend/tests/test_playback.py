@@ -0,0 +1,40 @@
+﻿from sqlalchemy import select
+
+from app import models
+from app.services.playback import upsert_playback_state
+
+
+def test_track_changes_within_one_unit_of_work_close_pending_history(db_session):
+    artist = models.Artist(spotify_id="sp-artist", spotify_uri="spotify:artist:sp-artist", name="Artist")
+    db_session.add(artist)
+    db_session.flush()
+    tracks = [
+        models.Track(
+            artist_id=artist.id,
+            spotify_id=f"sp-track-{i}",
+            spotify_uri=f"spotify:track:sp-track-{i}",
+            title=f"Track {i}",
+            uri=f"spotify:track:sp-track-{i}",
+            duration_ms=1000,
+        )
+        for i in range(3)
+    ]
+    room = models.Room(artist_id=artist.id, name="Room")
+    db_session.add_all([*tracks, room])
+    db_session.commit()
+
+    # Two track changes before one commit: the first history row is still pending
+    # when the second change has to close it.
+    upsert_playback_state(db_session, room, tracks[0], None, 0, False, None)
+    upsert_playback_state(db_session, room, tracks[1], None, 0, False, None)
+    db_session.commit()
+    upsert_playback_state(db_session, room, tracks[2], None, 0, False, None)
+    db_session.commit()
+
+    history = db_session.execute(
+        select(models.RoomTrackHistory.track_id, models.RoomTrackHistory.ended_at)
+        .order_by(models.RoomTrackHistory.id)
+    ).all()
+    assert [row.track_id for row in history] == [track.id for track in tracks]
+    assert [row.ended_at is not None for row in history] == [True, True, False]
+    assert room.playback_state.track_id == tracks[2].id
@@ -0,0 +1,68 @@
+﻿from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from app import models
+from app.main import app
+from app.routers import rooms
+
+
+client = TestClient(app)
+
+
+def _room_with_track(session) -> tuple[str, str]:
+    artist = models.Artist(spotify_id="sp-artist", spotify_uri="spotify:artist:sp-artist", name="Artist")
+    session.add(artist)
+    session.flush()
+    track = models.Track(
+        artist_id=artist.id,
+        spotify_id="sp-track",
+        spotify_uri="spotify:track:sp-track",
+        title="Track",
+        uri="spotify:track:sp-track",
+        duration_ms=1000,
+    )
+    room = models.Room(artist_id=artist.id, name="Room")
+    session.add_all([track, room])
+    session.commit()
+    return room.id, track.id
+
+
+def test_enqueue_appends_positions(db_session):
+    room_id, track_id = _room_with_track(db_session)
+
+    positions = [
+        client.post(f"/api/rooms/{room_id}/queue", json={"track_id": track_id}).json()["position"]
+        for _ in range(3)
+    ]
+
+    assert positions == [1, 2, 3]
+
+
+def test_enqueue_reports_missing_track(db_session):
+    room_id, _ = _room_with_track(db_session)
+
+    response = client.post(f"/api/rooms/{room_id}/queue", json={"track_id": "missing"})
+
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Track not found"
+
+
+def test_enqueue_gives_up_with_409_after_repeated_conflicts(db_session, monkeypatch):
+    room_id, track_id = _room_with_track(db_session)
+    # Stand in for a concurrent writer that wins every race: each INSERT fails its
+    # constraint while room and track both exist.
+    db_session.execute(text(
+        "CREATE TRIGGER test_queue_conflict BEFORE INSERT ON queue_entries "
+        "BEGIN SELECT RAISE(ABORT, 'position taken'); END"
+    ))
+    db_session.commit()
+    sleeps = []
+    monkeypatch.setattr(rooms.time, "sleep", sleeps.append)
+    try:
+        response = client.post(f"/api/rooms/{room_id}/queue", json={"track_id": track_id})
+    finally:
+        db_session.execute(text("DROP TRIGGER test_queue_conflict"))
+        db_session.commit()
+
+    assert response.status_code == 409
+    assert len(sleeps) == rooms.ENQUEUE_ATTEMPTS - 1
@@ -0,0 +1,58 @@
+﻿from datetime import datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event, select, update
+
+from app import models
+from app.main import app
+
+
+client = TestClient(app)
+
+
+def _room(session) -> models.Room:
+    artist = models.Artist(spotify_id="sp-artist", spotify_uri="spotify:artist:sp-artist", name="Artist")
+    session.add(artist)
+    session.flush()
+    room = models.Room(artist_id=artist.id, name="Room")
+    session.add(room)
+    session.commit()
+    return room
+
+
+def _user(session) -> models.User:
+    user = models.User(
+        spotify_id="sp-user",
+        display_name="Listener",
+        access_token="access-token",
+        refresh_token="refresh-token",
+        token_expires_at=datetime.now(timezone.utc) + timedelta(hours=1),
+    )
+    session.add(user)
+    session.commit()
+    return user
+
+
+def test_failed_join_rolls_back_writes_from_the_same_request(db_session):
+    room = _room(db_session)
+
+    def rename_room(_mapper, connection, _target):
+        # An earlier write in the request's transaction that the rollback must undo.
+        connection.execute(update(models.Room).where(models.Room.id == room.id).values(name="Renamed"))
+
+    event.listen(models.RoomMembership, "before_insert", rename_room)
+    try:
+        response = client.post(f"/api/rooms/{room.id}/join", json={"user_id": "missing"})
+    finally:
+        event.remove(models.RoomMembership, "before_insert", rename_room)
+
+    assert response.status_code == 404
+    assert response.json()["detail"] == "User not found"
+    assert db_session.scalar(select(models.Room.name).where(models.Room.id == room.id)) == "Room"
+    assert db_session.scalars(select(models.RoomMembership)).all() == []
+
+    # The pooled connection must come back out of its transaction, or the next BEGIN fails.
+    user = _user(db_session)
+    response = client.post(f"/api/rooms/{room.id}/join", json={"user_id": user.id})
+    assert response.status_code == 201
+    assert response.json()["user_id"] == user.id
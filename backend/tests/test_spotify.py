@@ -0,0 +1,60 @@
+﻿from datetime import datetime, timedelta, timezone
+
+import httpx
+from fastapi.testclient import TestClient
+
+from app import models
+from app.main import app
+from app.security import SESSION_COOKIE_NAME, create_session_token
+from app.services import spotify_oauth
+from app.utils.cache import spotify_token_cache
+
+
+def _add_user(session, expires_in: timedelta) -> models.User:
+    user = models.User(
+        spotify_id="sp-user",
+        display_name="Listener",
+        access_token="stored-token",
+        refresh_token="refresh-token",
+        token_expires_at=datetime.now(timezone.utc) + expires_in,
+    )
+    session.add(user)
+    session.commit()
+    return user
+
+
+def _client_for(user: models.User) -> TestClient:
+    return TestClient(app, cookies={SESSION_COOKIE_NAME: create_session_token(user.id)})
+
+
+def test_playback_token_is_served_from_the_cache(db_session):
+    user = _add_user(db_session, timedelta(hours=1))
+    client = _client_for(user)
+
+    assert client.get("/api/spotify/playback-token").json()["access_token"] == "stored-token"
+    user.access_token = "rotated-elsewhere"
+    db_session.commit()
+
+    assert client.get("/api/spotify/playback-token").json()["access_token"] == "stored-token"
+
+
+def test_expired_token_is_refreshed_once_then_cached(db_session, monkeypatch):
+    user = _add_user(db_session, timedelta(seconds=-5))
+    refreshes = []
+
+    def token_endpoint(request: httpx.Request) -> httpx.Response:
+        refreshes.append(request)
+        return httpx.Response(200, json={"access_token": "refreshed-token", "expires_in": 3600})
+
+    monkeypatch.setattr(spotify_oauth, "_token_http", httpx.Client(transport=httpx.MockTransport(token_endpoint)))
+    client = _client_for(user)
+
+    for _ in range(2):
+        response = client.get("/api/spotify/playback-token")
+        assert response.status_code == 200
+        assert response.json()["access_token"] == "refreshed-token"
+
+    assert len(refreshes) == 1
+    db_session.expire_all()
+    assert db_session.get(models.User, user.id).access_token == "refreshed-token"
+    assert spotify_token_cache.get(user.id)[0] == "refreshed-token"
@@ -0,0 +1,142 @@
+﻿import pytest
+from sqlalchemy import func, select
+
+from app import models
+from app.database import SessionLocal
+from app.services.spotify_sync import SpotifyCatalogSync, _normalize_isrc
+
+
+class FakeCatalog:
+    """Serves a tiny Spotify catalogue to SpotifyClient.get_json and records every path."""
+
+    def __init__(self, albums: dict[str, dict[str, list[str]]]) -> None:
+        # artist id -> album id -> track ids
+        self.albums = albums
+        self.calls: list[str] = []
+
+    def get_json(self, path: str, *, params=None) -> dict:
+        self.calls.append(path)
+        path, _, ids = path.partition("?ids=")
+        parts = path.strip("/").split("/")
+        if path == "/tracks":
+            return {"tracks": [{"id": i, "uri": f"spotify:track:{i}", "name": i, "duration_ms": 1000} for i in ids.split(",")]}
+        if path == "/audio-features":
+            return {"audio_features": [{"id": i, "energy": 0.5} for i in ids.split(",")]}
+        if parts[0] == "artists" and len(parts) == 3:
+            return {"items": [{"id": album_id} for album_id in self.albums[parts[1]]], "next": None}
+        if parts[0] == "artists":
+            return {"id": parts[1], "uri": f"spotify:artist:{parts[1]}", "name": parts[1], "followers": {"total": 1}}
+        if parts[0] == "albums":
+            artist_id, tracks = next(
+                (artist_id, albums[parts[1]]) for artist_id, albums in self.albums.items() if parts[1] in albums
+            )
+            items = [
+                {"id": track_id, "name": track_id, "duration_ms": 1000, "track_number": n, "artists": [{"id": artist_id}]}
+                for n, track_id in enumerate(tracks, start=1)
+            ]
+            return {"name": parts[1], "uri": f"spotify:album:{parts[1]}", "tracks": {"items": items, "next": None}}
+        raise AssertionError(f"unexpected Spotify path {path}")
+
+    def album_calls(self) -> int:
+        return sum(path.startswith("/albums/") for path in self.calls)
+
+
+def _syncer(catalog: FakeCatalog, **options) -> SpotifyCatalogSync:
+    syncer = SpotifyCatalogSync("client-id", "client-secret", **options)
+    syncer.client.get_json = catalog.get_json
+    return syncer
+
+
+def _track_count(session) -> int:
+    return session.scalar(select(func.count()).select_from(models.Track))
+
+
+def test_unchanged_catalogue_is_skipped_until_forced(db_session):
+    catalog = FakeCatalog({"artist-1": {"album-1": ["t1", "t2"], "album-2": ["t3"]}})
+    syncer = _syncer(catalog)
+
+    first = syncer.sync(db_session, ["artist-1"])
+    assert (first.artists_created, first.tracks_created, first.artists_unchanged) == (1, 3, 0)
+    assert catalog.album_calls() == 2
+
+    catalog.calls.clear()
+    again = syncer.sync(db_session, ["artist-1"])
+    assert (again.artists_updated, again.artists_unchanged, again.albums_processed) == (1, 1, 0)
+    assert catalog.album_calls() == 0
+
+    catalog.calls.clear()
+    forced = syncer.sync(db_session, ["artist-1"], force=True)
+    assert (forced.artists_unchanged, forced.albums_processed, forced.tracks_updated) == (0, 2, 3)
+    assert catalog.album_calls() == 2
+    assert _track_count(db_session) == 3
+
+
+def test_new_album_invalidates_the_catalogue_hash(db_session):
+    catalog = FakeCatalog({"artist-1": {"album-1": ["t1"]}})
+    syncer = _syncer(catalog)
+    syncer.sync(db_session, ["artist-1"])
+
+    catalog.albums["artist-1"]["album-2"] = ["t2"]
+    stats = syncer.sync(db_session, ["artist-1"])
+
+    assert (stats.artists_unchanged, stats.tracks_created) == (0, 1)
+    assert _track_count(db_session) == 2
+    artist = db_session.scalar(select(models.Artist))
+    assert "catalog_hash" not in artist.metadata_json
+
+
+def test_batch_commits_once_and_a_failed_artist_only_undoes_itself(db_session):
+    catalog = FakeCatalog({"artist-1": {"album-1": ["t1"]}, "artist-2": {"album-2": ["t2"]}})
+    committed_mid_batch = []
+
+    def get_json(path: str, *, params=None) -> dict:
+        if path == "/artists/artist-2/albums":
+            # artist-1's savepoint has been released by now; another connection
+            # must not see it before the batch commits.
+            with SessionLocal() as other:
+                committed_mid_batch.append(other.scalar(select(func.count()).select_from(models.Artist)))
+            raise RuntimeError("album listing failed")
+        return catalog.get_json(path, params=params)
+
+    syncer = _syncer(catalog)
+    syncer.client.get_json = get_json
+    with pytest.raises(RuntimeError):
+        syncer.sync(db_session, ["artist-1", "artist-2"])
+
+    assert committed_mid_batch == [0]
+    db_session.expire_all()
+    assert db_session.scalars(select(models.Artist.spotify_id)).all() == ["artist-1"]
+    assert _track_count(db_session) == 1
+
+
+def test_album_cache_is_reused_across_runs_and_renewed_by_force(db_session, tmp_path):
+    cache_path = str(tmp_path / "albums")
+    albums = {"artist-1": {"album-1": ["t1", "t2"], "album-2": ["t3"]}}
+    _syncer(FakeCatalog(albums), album_cache_path=cache_path).sync(db_session, ["artist-1"])
+    # Forget the catalogue hash so the next run syncs albums instead of skipping them.
+    db_session.scalar(select(models.Artist)).catalog_hash = None
+    db_session.commit()
+
+    catalog = FakeCatalog(albums)
+    stats = _syncer(catalog, album_cache_path=cache_path).sync(db_session, ["artist-1"])
+    assert (stats.albums_processed, stats.tracks_updated) == (2, 3)
+    assert catalog.album_calls() == 0
+
+    catalog = FakeCatalog(albums)
+    _syncer(catalog, album_cache_path=cache_path).sync(db_session, ["artist-1"], force=True)
+    assert catalog.album_calls() == 2
+
+
+@pytest.mark.parametrize(
+    ("raw", "expected"),
+    [
+        ("USRC17607839", "USRC17607839"),
+        ("us-rc1-76-07839", "USRC17607839"),
+        (" USRC17607839 ", "USRC17607839"),
+        ("USRC1760783", None),
+        ("USRC17607839X", None),
+        (None, None),
+    ],
+)
+def test_isrc_is_normalised_before_insert(raw, expected):
+    assert _normalize_isrc(raw) == expected
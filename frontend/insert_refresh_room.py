@@ -1,82 +1,112 @@
+import os
+import re
 from pathlib import Path
 
+# Function header the block goes after, and the header that shows it is already there.
+ANCHOR = b'async function syncCurrentRoomPlayback()'
+APPLIED_MARKER = b'async function refreshRoomPlayback('
+
+# Braces, plus the comment and string spans whose braces must not count towards depth.
+_BRACE_RE = re.compile(
+    rb'//[^\n]*'
+    rb'|/\*.*?\*/'
+    rb'|"(?:\\.|[^"\\\n])*"'
+    rb"|'(?:\\.|[^'\\\n])*'"
+    rb'|`(?:\\.|[^`\\])*`'
+    rb'|[{}]',
+    re.DOTALL,
+)
+# Whitespace-only lines, including a trailing one without a newline.
+_BLANK_LINES_RE = re.compile(rb'(?:[ \t\r\f\v]*\n)*(?:[ \t\r\f\v]+\Z)?')
+
+_NEW_BLOCK = (
+    b"\n"
+    b"async function refreshRoomPlayback(roomId: UUID): Promise<void> {\n"
+    b"  if (state.offline) return;\n"
+    b"  const index = state.rooms.findIndex((room) => room.id === roomId);\n"
+    b"  if (index === -1) return;\n"
+    b"  try {\n"
+    b"    const playback = await fetchJSON<ApiPlaybackState>(`/rooms/${roomId}/playback`);\n"
+    b"    const room = state.rooms[index];\n"
+    b"    const listeners = typeof playback.listeners === 'number' ? playback.listeners : room.listeners;\n"
+    b"    const duration = playback.track\n"
+    b"      ? readNumber((playback.track as { duration_ms?: number }).duration_ms) ?? (playback.track as { durationMs?: number }).durationMs\n"
+    b"      : undefined;\n"
+    b"    const progress = estimatePlaybackPosition(playback);\n"
+    b"    const artistName = playback.track\n"
+    b"      ? state.artists.find((a) => a.id === playback.track?.artistId)?.name ?? room.now_playing?.artist\n"
+    b"      : undefined;\n"
+    b"    const updated: RoomView = {\n"
+    b"      ...room,\n"
+    b"      playback_state: playback,\n"
+    b"      listeners,\n"
+    b"      now_playing: playback.track\n"
+    b"        ? {\n"
+    b"            title: playback.track.title,\n"
+    b"            artist: artistName,\n"
+    b"            progress_ms: progress,\n"
+    b"            duration_ms: duration ?? room.now_playing?.duration_ms,\n"
+    b"          }\n"
+    b"        : undefined,\n"
+    b"    };\n"
+    b"    state.rooms[index] = updated;\n"
+    b"    if (state.currentRoomId === roomId) {\n"
+    b"      updatePlaybackCard(updated);\n"
+    b"      await syncRoomPlayback(updated);\n"
+    b"    }\n"
+    b"    renderRoomList(state.rooms);\n"
+    b"  } catch (error) {\n"
+    b"    const status = (error as Error & { status?: number }).status;\n"
+    b"    if (status === 404) {\n"
+    b"      const room = state.rooms[index];\n"
+    b"      const cleared: RoomView = { ...room, playback_state: null, now_playing: undefined };\n"
+    b"      state.rooms[index] = cleared;\n"
+    b"      if (state.currentRoomId === roomId) {\n"
+    b"        updatePlaybackCard(cleared);\n"
+    b"      }\n"
+    b"      renderRoomList(state.rooms);\n"
+    b"      return;\n"
+    b"    }\n"
+    b"    console.warn('Failed to refresh playback state', error);\n"
+    b"    enterOfflineMode();\n"
+    b"  }\n"
+    b"}\n\n"
+)
+# The block is inserted with CRLF line endings; convert it once when the script loads.
+NEW_BLOCK_CRLF = _NEW_BLOCK.replace(b'\n', b'\r\n')
+
 path = Path('src/app.ts')
+# Work on the raw bytes: the needle, braces and inserted block are ASCII, so no decode/encode
+# pass is needed and the file keeps its own encoding and line endings.
+original = path.read_bytes()
+if APPLIED_MARKER in original:
+    print('refreshRoomPlayback already present; src/app.ts left unchanged')
+    raise SystemExit(0)
 try:
-    original = path.read_text(encoding='utf-8')
-except UnicodeDecodeError:
-    original = path.read_text(encoding='cp932')
-lines = original.splitlines(keepends=True)
-needle = 'async function syncCurrentRoomPlayback()'
-insert_index = None
-for i, line in enumerate(lines):
-    if needle in line:
-        insert_index = i
-        break
-if insert_index is None:
-    raise SystemExit('syncCurrentRoomPlayback not found')
-end_index = insert_index
-brace_depth = 0
-for j in range(insert_index, len(lines)):
-    brace_depth += lines[j].count('{')
-    brace_depth -= lines[j].count('}')
-    if brace_depth == 0 and j > insert_index:
-        end_index = j
-        break
-insert_pos = end_index + 1
-while insert_pos < len(lines) and lines[insert_pos].strip() == '':
-    insert_pos += 1
-new_block = (
-    "\n"
-    "async function refreshRoomPlayback(roomId: UUID): Promise<void> {\n"
-    "  if (state.offline) return;\n"
-    "  const index = state.rooms.findIndex((room) => room.id === roomId);\n"
-    "  if (index === -1) return;\n"
-    "  try {\n"
-    "    const playback = await fetchJSON<ApiPlaybackState>(`/rooms/${roomId}/playback`);\n"
-    "    const room = state.rooms[index];\n"
-    "    const listeners = typeof playback.listeners === 'number' ? playback.listeners : room.listeners;\n"
-    "    const duration = playback.track\n"
-    "      ? readNumber((playback.track as { duration_ms?: number }).duration_ms) ?? (playback.track as { durationMs?: number }).durationMs\n"
-    "      : undefined;\n"
-    "    const progress = estimatePlaybackPosition(playback);\n"
-    "    const artistName = playback.track\n"
-    "      ? state.artists.find((a) => a.id === playback.track?.artistId)?.name ?? room.now_playing?.artist\n"
-    "      : undefined;\n"
-    "    const updated: RoomView = {\n"
-    "      ...room,\n"
-    "      playback_state: playback,\n"
-    "      listeners,\n"
-    "      now_playing: playback.track\n"
-    "        ? {\n"
-    "            title: playback.track.title,\n"
-    "            artist: artistName,\n"
-    "            progress_ms: progress,\n"
-    "            duration_ms: duration ?? room.now_playing?.duration_ms,\n"
-    "          }\n"
-    "        : undefined,\n"
-    "    };\n"
-    "    state.rooms[index] = updated;\n"
-    "    if (state.currentRoomId === roomId) {\n"
-    "      updatePlaybackCard(updated);\n"
-    "      await syncRoomPlayback(updated);\n"
-    "    }\n"
-    "    renderRoomList(state.rooms);\n"
-    "  } catch (error) {\n"
-    "    const status = (error as Error & { status?: number }).status;\n"
-    "    if (status === 404) {\n"
-    "      const room = state.rooms[index];\n"
-    "      const cleared: RoomView = { ...room, playback_state: null, now_playing: undefined };\n"
-    "      state.rooms[index] = cleared;\n"
-    "      if (state.currentRoomId === roomId) {\n"
-    "        updatePlaybackCard(cleared);\n"
-    "      }\n"
-    "      renderRoomList(state.rooms);\n"
-    "      return;\n"
-    "    }\n"
-    "    console.warn('Failed to refresh playback state', error);\n"
-    "    enterOfflineMode();\n"
-    "  }\n"
-    "}\n\n"
-)
-lines.insert(insert_pos, new_block.replace('\n', '\r\n'))
-path.write_text(''.join(lines), encoding='utf-8')
+    start = original.index(ANCHOR)
+except ValueError:
+    raise SystemExit('syncCurrentRoomPlayback not found') from None
+# Walk forward from the function header to the brace that closes its body.
+line_end = original.find(b'\n', start)
+end = len(original) if line_end == -1 else line_end + 1
+depth = 0
+opened = False
+# The regex engine skips everything between braces (including comments and strings in one
+# step), so Python only runs once per brace or skipped span.
+for match in _BRACE_RE.finditer(original, start):
+    token = match.group()
+    if token == b'{':
+        depth += 1
+        opened = True
+    elif token == b'}':
+        depth -= 1
+        if opened and depth == 0:
+            line_end = original.find(b'\n', match.start())
+            end = len(original) if line_end == -1 else line_end + 1
+            break
+# Insert after any blank lines that follow the function.
+end = _BLANK_LINES_RE.match(original, end).end()
+# Write beside the original and swap it in, so an interrupted run never leaves a truncated app.ts.
+tmp = path.with_suffix(path.suffix + '.tmp')
+tmp.write_bytes(b''.join((original[:end], NEW_BLOCK_CRLF, original[end:])))
+os.replace(tmp, path)
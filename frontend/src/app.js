@@ -408,7 +408,7 @@ const filterRooms = (keyword) => {
     renderRoomList(filtered);
     ensureRoomSelection(filtered);
 };
-const fetchJSON = async (path, options = {}) => {
+const fetchResponse = async (path, options = {}) => {
     if (state.offline)
         throw new Error('offline');
     const url = path.startsWith('http') ? path : `${API_PREFIX}${path}`;
@@ -441,10 +441,28 @@ const fetchJSON = async (path, options = {}) => {
         error.body = text;
         throw error;
     }
+    return response;
+};
+const fetchJSON = async (path, options = {}) => {
+    const response = await fetchResponse(path, options);
     if (response.status === 204)
         return null;
     return (await response.json());
 };
+const ARTIST_PAGE_SIZE = 200;
+const fetchAllArtists = async () => {
+    const artists = [];
+    let cursor = null;
+    do {
+        const params = new URLSearchParams({ limit: String(ARTIST_PAGE_SIZE) });
+        if (cursor)
+            params.set('cursor', cursor);
+        const response = await fetchResponse(`/artists?${params.toString()}`);
+        artists.push(...(await response.json()));
+        cursor = response.headers.get('X-Next-Cursor');
+    } while (cursor);
+    return artists;
+};
 const ensureUser = async () => {
     try {
         const user = await fetchJSON('/users/me');
@@ -472,7 +490,7 @@ const ensureUser = async () => {
 };
 const loadArtists = async () => {
     try {
-        const artists = await fetchJSON('/artists');
+        const artists = await fetchAllArtists();
         state.offline = false;
         elements.offlineNotice.classList.add('hidden');
         state.artists = artists;
@@ -591,7 +609,7 @@ const handleChatSubmit = async (event) => {
         }
         else {
             message = {
-                id: `offline-${Date.now()}`,
+                id: -Date.now(),
                 roomId,
                 userId: state.user.id,
                 body: textValue,
@@ -634,7 +652,7 @@ const handleQueueRequest = async (event) => {
         else {
             const queue = state.queue.get(roomId) ?? [];
             queue.push({
-                id: `offline-${Date.now()}`,
+                id: -Date.now(),
                 room_id: roomId,
                 track_id: trackId,
                 position: queue.length + 1,
@@ -43,7 +43,7 @@ interface ApiRoom {
 }
 
 interface ApiQueueItem {
-  id: UUID;
+  id: number;
   room_id: UUID;
   track_id: UUID;
   position: number;
@@ -55,7 +55,7 @@ interface ApiQueueItem {
 }
 
 interface ApiMessage {
-  id: UUID;
+  id: number;
   roomId: UUID;
   userId: UUID;
   body: string;
@@ -585,7 +585,7 @@ interface FetchOptions extends Omit<RequestInit, 'body'> {
   body?: unknown;
 }
 
-const fetchJSON = async <T>(path: string, options: FetchOptions = {}): Promise<T> => {
+const fetchResponse = async (path: string, options: FetchOptions = {}): Promise<Response> => {
   if (state.offline) throw new Error('offline');
   const url = path.startsWith('http') ? path : `${API_PREFIX}${path}`;
   const { body, credentials, ...init } = options;
@@ -614,10 +614,30 @@ const fetchJSON = async <T>(path: string, options: FetchOptions = {}): Promise<T
     error.body = text;
     throw error;
   }
+  return response;
+};
+
+const fetchJSON = async <T>(path: string, options: FetchOptions = {}): Promise<T> => {
+  const response = await fetchResponse(path, options);
   if (response.status === 204) return null as T;
   return (await response.json()) as T;
 };
 
+const ARTIST_PAGE_SIZE = 200;
+
+const fetchAllArtists = async (): Promise<ApiArtist[]> => {
+  const artists: ApiArtist[] = [];
+  let cursor: string | null = null;
+  do {
+    const params = new URLSearchParams({ limit: String(ARTIST_PAGE_SIZE) });
+    if (cursor) params.set('cursor', cursor);
+    const response = await fetchResponse(`/artists?${params.toString()}`);
+    artists.push(...((await response.json()) as ApiArtist[]));
+    cursor = response.headers.get('X-Next-Cursor');
+  } while (cursor);
+  return artists;
+};
+
 const ensureUser = async (): Promise<void> => {
   try {
     const user = await fetchJSON<ApiUser>('/users/me');
@@ -646,7 +666,7 @@ const ensureUser = async (): Promise<void> => {
 
 const loadArtists = async (): Promise<void> => {
   try {
-    const artists = await fetchJSON<ApiArtist[]>('/artists');
+    const artists = await fetchAllArtists();
     state.offline = false;
     elements.offlineNotice.classList.add('hidden');
     state.artists = artists;
@@ -758,7 +778,7 @@ const handleChatSubmit = async (event: SubmitEvent): Promise<void> => {
       });
     } else {
       message = {
-        id: `offline-${Date.now()}`,
+        id: -Date.now(),
         roomId,
         userId: state.user.id,
         body: textValue,
@@ -798,7 +818,7 @@ const handleQueueRequest = async (event: SubmitEvent): Promise<void> => {
     } else {
       const queue = state.queue.get(roomId) ?? [];
       queue.push({
-        id: `offline-${Date.now()}`,
+        id: -Date.now(),
         room_id: roomId,
         track_id: trackId,
         position: queue.length + 1,